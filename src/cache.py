@@ -0,0 +1,44 @@
+import collections
+import threading
+
+
+class LruCache(object):
+    """Thread-safe cache of ndarrays, evicting the least recently used ones
+       beyond a total size."""
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: Size beyond which least recently used values are
+                          evicted
+        """
+        self.maxBytes = max_bytes
+        self._values = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return cached value, or None."""
+        with self._lock:
+            value = self._values.pop(key, None)
+            if value is not None:
+                # Mark as most recently used.
+                self._values[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            previous = self._values.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._values[key] = value
+            self._bytes += value.nbytes
+
+            # Evict least recently used values.
+            while self._bytes > self.maxBytes and len(self._values) > 1:
+                _, evicted = self._values.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._bytes = 0
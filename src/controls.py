@@ -11,6 +11,7 @@ from PyQt5.QtWidgets import QSlider
 from PyQt5.QtWidgets import QHBoxLayout
 from PyQt5.QtWidgets import QFormLayout
 from PyQt5.QtWidgets import QLineEdit
+from PyQt5.QtWidgets import QStyleOptionSlider
 
 
 class ControlsInterface(QWidget):
@@ -39,6 +40,18 @@ class ControlsInterface(QWidget):
             args[control.key()] = control.value()
         return args
 
+    def neighbourArgs(self):
+        """Return list of dictionaries of user-inputted values, each with a
+           single control moved one step from its current value."""
+        args = self.args()
+        neighbours = []
+        for control in self._controls:
+            for value in control.neighbourValues():
+                neighbour = dict(args)
+                neighbour[control.key()] = value
+                neighbours.append(neighbour)
+        return neighbours
+
     def _valueChanged(self):
         self.valueChanged.emit()
 
@@ -67,6 +80,34 @@ class Control(QWidget):
     def value(self):
         return self._value
 
+    def neighbourValues(self):
+        """Return values the user is likely to select next."""
+        return []
+
+
+class Option(object):
+    """Named choice offered by an OptionSelect."""
+
+    # Static constants.
+    OPTIONS = []
+    _ID = 0
+
+    def __init__(self, name):
+        self._id = Option._ID
+        self.name = name
+
+        # Keep static reference to this Option instance.
+        Option.OPTIONS.append(self)
+        Option._ID += 1
+
+    def __reduce__(self):
+        # Pickle by reference, so that options may be compared by identity.
+        return (getOption, (self._id,))
+
+
+def getOption(option_id):
+    return Option.OPTIONS[option_id]
+
 
 class OptionSelect(Control):
     """Custom widget for selecting from a list of options."""
@@ -130,9 +171,13 @@ class ValueControl(Control):
         self.reset()
 
     def setValue(self, value):
+        self._value = value
         self._valueSlider.setValueF(value)
         self._valueField.setText(str(value))
 
+    def neighbourValues(self):
+        return self._valueSlider.neighbourValuesF()
+
     def _valueEntered(self):
         """Called upon value typed into field."""
         try:
@@ -171,14 +216,44 @@ class FloatSlider(QSlider):
 
         self._precision = precision
 
-        self.setMinimum(vmin * 10 ** precision)
-        self.setMaximum(vmax * 10 ** precision)
+        # QSlider takes whole ticks only.
+        self.setMinimum(int(round(vmin * 10 ** precision)))
+        self.setMaximum(int(round(vmax * 10 ** precision)))
         self.setTickPosition(QSlider.NoTicks)
         self.setSingleStep(1)
         self.sliderMoved.connect(self._valueChanged)
 
     def setValueF(self, value):
-        self.setValue(value * 10 ** self._precision)
+        self.setValue(int(round(value * 10 ** self._precision)))
+
+    def neighbourValuesF(self):
+        """Return values reached by dragging the slider one pixel either 
+           way, as emitted by valueFChanged."""
+        option = QStyleOptionSlider()
+        self.initStyleOption(option)
+        style = self.style()
+        groove = style.subControlRect(
+            QStyle.CC_Slider, option, QStyle.SC_SliderGroove, self)
+        handle = style.subControlRect(
+            QStyle.CC_Slider, option, QStyle.SC_SliderHandle, self)
+
+        # Map positions as QSlider does while the handle is dragged.
+        span = groove.width() - handle.width()
+        if span <= 0:
+            return []
+        position = QStyle.sliderPositionFromValue(
+            self.minimum(), self.maximum(), self.value(), span, 
+            option.upsideDown)
+
+        values = []
+        for neighbour in (position - 1, position + 1):
+            if 0 <= neighbour <= span:
+                value = QStyle.sliderValueFromPosition(
+                    self.minimum(), self.maximum(), neighbour, span,
+                    option.upsideDown)
+                if value != self.value():
+                    values.append(value / 10.0 ** self._precision)
+        return values
 
     def _valueChanged(self, value):
         self.valueFChanged.emit(value / 10.0 ** self._precision)
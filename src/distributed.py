@@ -0,0 +1,483 @@
+"""
+Renders fractals across several processes or machines.
+
+A Coordinator splits each frame of a job into tiles, which are handed out
+over TCP to workers running the fractal core headlessly. Workers connect to
+the coordinator, so any number may join or leave while a job runs:
+
+    PYFRACTALS_AUTHKEY=<coordinator.authkey, in hex> \
+        python distributed.py worker <coordinator host> <coordinator port>
+
+Messages are pickled, so both ends prove they hold the coordinator's authkey
+before any message is unpickled; peers without it cannot run code on either.
+"""
+import binascii
+import collections
+import hashlib
+import hmac
+import os
+import pickle
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+
+# Seconds between heartbeats sent by a worker.
+HEARTBEAT_INTERVAL = 2.0
+
+# Environment variable passing the coordinator's authkey to workers, in hex;
+# unlike arguments, it is not visible to other users of the machine.
+AUTHKEY_VARIABLE = "PYFRACTALS_AUTHKEY"
+
+
+class AuthenticationError(Exception):
+    """Raised when a peer fails to prove that it holds the authkey."""
+
+
+class Connection(object):
+    """Exchanges pickled messages over a socket."""
+
+    _HEADER = struct.Struct("!Q")
+    _CHALLENGE_SIZE = 32
+
+    def __init__(self, sock):
+        self._socket = sock
+        self._sendLock = threading.Lock()
+
+    def authenticate(self, authkey, role, peer_role):
+        """
+        Check that the peer holds authkey, and prove that this end does, by
+        answering each other's random challenge with its HMAC. Must precede
+        any other message.
+
+        :param role: Name of this end, e.g. "worker", signed along with the
+                     challenge so that a peer cannot reflect our own answer
+        :param peer_role: Name of the peer
+        :raises AuthenticationError: If the peer's answer is wrong
+        """
+        challenge = os.urandom(Connection._CHALLENGE_SIZE)
+        self._socket.sendall(challenge)
+        peer_challenge = self._receiveExactly(Connection._CHALLENGE_SIZE)
+        self._socket.sendall(_answer(authkey, role, peer_challenge))
+
+        answer = self._receiveExactly(hashlib.sha256().digest_size)
+        if not hmac.compare_digest(
+                answer, _answer(authkey, peer_role, challenge)):
+            raise AuthenticationError("Peer does not hold the authkey")
+
+    def send(self, message):
+        data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        with self._sendLock:
+            self._socket.sendall(Connection._HEADER.pack(len(data)) + data)
+
+    def receive(self):
+        """Return next message; raises EOFError if the peer disconnected."""
+        size, = Connection._HEADER.unpack(
+            self._receiveExactly(Connection._HEADER.size))
+        return pickle.loads(self._receiveExactly(size))
+
+    def close(self):
+        try:
+            self._socket.close()
+        except socket.error:
+            pass
+
+    def _receiveExactly(self, size):
+        chunks = []
+        while size:
+            chunk = self._socket.recv(min(size, 1 << 20))
+            if not chunk:
+                raise EOFError("Connection closed by peer")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+
+class _Task(object):
+    """Single tile of a single frame."""
+
+    __slots__ = ("id", "frame", "tile", "spec", "runners", "attempts",
+                 "started", "done")
+
+    def __init__(self, task_id, frame, tile, spec):
+        self.id = task_id
+        self.frame = frame
+        self.tile = tile
+        self.spec = spec
+        self.runners = set()
+        self.attempts = 0
+        self.started = None
+        self.done = False
+
+
+class Coordinator(object):
+    """
+    Distributes render jobs between connected workers.
+
+    Workers pull tiles from a shared queue, so fast workers take more of them.
+    Once the queue is empty, idle workers steal the longest running tile of a
+    slower worker and the first result returned is kept. A worker which
+    disconnects or misses heartbeats for heartbeat_timeout seconds has its
+    tile queued again, up to max_retries times.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, heartbeat_timeout=10.0,
+                 max_retries=3, authkey=None):
+        """
+        :param host: Interface to listen on; only this machine by default,
+                     "" for every interface
+        :param authkey: Bytes which workers must hold; random by default
+        """
+        if authkey is None:
+            authkey = os.urandom(32)
+        self.authkey = authkey
+        self._heartbeatTimeout = heartbeat_timeout
+        self._maxRetries = max_retries
+
+        # Job state, guarded by _condition.
+        self._condition = threading.Condition()
+        self._pending = collections.deque()
+        self._running = set()
+        self._frames = {}
+        self._remaining = 0
+        self._error = None
+        self._closed = False
+        self._workers = 0
+
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen(64)
+        self.address = self._server.getsockname()
+
+        thread = threading.Thread(target=self._acceptWorkers)
+        thread.daemon = True
+        thread.start()
+
+    def workerCount(self):
+        """Return number of currently connected workers."""
+        with self._condition:
+            return self._workers
+
+    def waitForWorkers(self, count, timeout=None):
+        """Block until at least count workers are connected."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._workers < count:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise RuntimeError(
+                        "Only %d of %d workers connected" % (self._workers, count))
+                self._condition.wait(remaining)
+
+    def render(self, fractal, views, frame_args=None, tile_size=256):
+        """
+        Compute raw fractal for each view, using the fractal's resolution,
+        iterations and controls.
+
+        :param fractal: Fractal to render
+        :param views: List of tuples (xmin, ymin, xmax, ymax), one per frame
+        :param frame_args: Optional list of per-frame control value overrides
+        :param tile_size: Width and height of tiles, in pixels; fractals
+                          which are not pointwise, see
+                          Fractal._isPointwise, are sent as a single task
+                          per frame
+        :return: List of raw FractalResults, one per frame
+        """
+        base_args = fractal.controls.args()
+        tasks = []
+        for frame, view in enumerate(views):
+            args = dict(base_args)
+            if frame_args:
+                args.update(frame_args[frame])
+
+            if fractal._isPointwise(**args):
+                tiles = [
+                    (x0, y0, min(x0 + tile_size, fractal.xres),
+                     min(y0 + tile_size, fractal.yres))
+                    for x0 in range(0, fractal.xres, tile_size)
+                    for y0 in range(0, fractal.yres, tile_size)
+                ]
+            else:
+                # Tiles of fractals whose pixels depend on one another, e.g.
+                # the Buddhabrot's, would each redo the whole frame's work.
+                tiles = [(0, 0, fractal.xres, fractal.yres)]
+
+            for tile in tiles:
+                spec = {
+                    "fractal": fractal._id,
+                    "view": tuple(view),
+                    "resolution": (fractal.xres, fractal.yres),
+                    "itermax": fractal.itermax,
+                    "aaSamples": fractal.aaSamples,
+                    "aaThreshold": fractal.aaThreshold,
+                    "args": args,
+                    "tile": tile,
+                }
+                tasks.append(_Task(len(tasks), frame, tile, spec))
+
+        with self._condition:
+            if self._remaining:
+                raise RuntimeError("Coordinator is already running a job")
+            self._pending.extend(tasks)
+            self._frames = {}
+            self._remaining = len(tasks)
+            self._error = None
+            self._condition.notify_all()
+
+            while self._remaining and self._error is None:
+                self._condition.wait()
+
+            if self._error is not None:
+                self._pending.clear()
+                self._running.clear()
+                self._remaining = 0
+                raise RuntimeError(self._error)
+
+            frames = self._frames
+            self._frames = {}
+
+        return [frames[frame] for frame in range(len(views))]
+
+    def close(self):
+        """Stop accepting workers and ask connected workers to exit."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        try:
+            self._server.close()
+        except socket.error:
+            pass
+
+
+    # {{{ - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # }}} Worker Handling
+
+    def _acceptWorkers(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except socket.error:
+                # Server socket closed.
+                return
+
+            sock.settimeout(self._heartbeatTimeout)
+            thread = threading.Thread(target=self._serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, sock):
+        """Feed tasks to a single worker until it is lost or closed."""
+        connection = Connection(sock)
+        try:
+            connection.authenticate(self.authkey, "coordinator", "worker")
+        except (socket.error, EOFError, AuthenticationError):
+            connection.close()
+            return
+
+        with self._condition:
+            self._workers += 1
+            self._condition.notify_all()
+
+        task = None
+        try:
+            while True:
+                task = self._nextTask(connection)
+                if task is None:
+                    connection.send(("stop",))
+                    return
+
+                connection.send(("task", task.id, task.spec))
+                while True:
+                    message = connection.receive()
+                    if message[0] == "result":
+                        self._finish(connection, task, message[2])
+                        break
+                    elif message[0] == "error":
+                        self._fail(connection, task, message[2])
+                        break
+
+                task = None
+        except (socket.error, EOFError, pickle.UnpicklingError):
+            # Worker disconnected, or stopped sending heartbeats.
+            if task is not None:
+                self._fail(connection, task, "Worker lost")
+        finally:
+            connection.close()
+            with self._condition:
+                self._workers -= 1
+
+    def _nextTask(self, connection):
+        """Block until there is a task for this worker, or return None once
+           the coordinator is closed."""
+        with self._condition:
+            while not self._closed:
+                while self._pending:
+                    task = self._pending.popleft()
+                    if not task.done:
+                        return self._assign(connection, task)
+
+                # Steal work from the slowest worker.
+                stealable = [
+                    task for task in self._running
+                    if len(task.runners) == 1 and connection not in task.runners
+                ]
+                if stealable:
+                    task = min(stealable, key=lambda task: task.started)
+                    return self._assign(connection, task)
+
+                self._condition.wait()
+
+        return None
+
+    def _assign(self, connection, task):
+        if not task.runners:
+            task.started = time.time()
+        task.runners.add(connection)
+        self._running.add(task)
+        return task
+
+    def _finish(self, connection, task, raw):
+        with self._condition:
+            task.runners.discard(connection)
+            if task.done or task not in self._running:
+                # Another worker finished first, or the job was abandoned.
+                return
+
+            task.done = True
+            self._running.discard(task)
+
+            # Assemble tile into its frame.
+            if task.frame not in self._frames:
+                xres, yres = task.spec["resolution"]
+                self._frames[task.frame] = raw.empty((xres, yres))
+            x0, y0, x1, y1 = task.tile
+            self._frames[task.frame][..., x0:x1, y0:y1] = raw
+
+            self._remaining -= 1
+            self._condition.notify_all()
+
+    def _fail(self, connection, task, reason):
+        with self._condition:
+            task.runners.discard(connection)
+            if task.done or task.runners or task not in self._running:
+                # Task completed or still being computed elsewhere.
+                return
+
+            self._running.discard(task)
+            task.attempts += 1
+            if task.attempts > self._maxRetries:
+                self._error = "Tile %s of frame %d failed %d times: %s" % (
+                    task.tile, task.frame, task.attempts, reason)
+            else:
+                self._pending.appendleft(task)
+            self._condition.notify_all()
+
+
+def computeTask(spec):
+    """Return raw fractal tile described by a coordinator's task spec."""
+    from fractals import fractals
+
+    fractal = fractals.getFractal(spec["fractal"])
+    fractal.xres, fractal.yres = spec["resolution"]
+    fractal.setView(*spec["view"])
+    fractal.itermax = spec["itermax"]
+    fractal.aaSamples = spec["aaSamples"]
+    fractal.aaThreshold = spec["aaThreshold"]
+    return fractal.computeTile(*spec["tile"], **spec["args"])
+
+
+def work(host, port, authkey):
+    """
+    Compute tasks sent by the coordinator at (host, port) until stopped.
+
+    :param authkey: Bytes held by the coordinator, as Coordinator.authkey
+    """
+    connection = Connection(socket.create_connection((host, port)))
+    try:
+        connection.authenticate(authkey, "worker", "coordinator")
+    except (socket.error, EOFError, AuthenticationError):
+        connection.close()
+        raise
+    stopped = threading.Event()
+
+    def sendHeartbeats():
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                connection.send(("heartbeat",))
+            except socket.error:
+                return
+
+    heartbeat_thread = threading.Thread(target=sendHeartbeats)
+    heartbeat_thread.daemon = True
+    heartbeat_thread.start()
+
+    try:
+        while True:
+            message = connection.receive()
+            if message[0] == "stop":
+                return
+
+            _, task_id, spec = message
+            try:
+                raw = computeTask(spec)
+            except Exception:
+                connection.send(("error", task_id, traceback.format_exc()))
+            else:
+                connection.send(("result", task_id, raw))
+    except (socket.error, EOFError):
+        # Coordinator has gone away.
+        return
+    finally:
+        stopped.set()
+        connection.close()
+
+
+def launchLocalWorkers(count, address, authkey):
+    """
+    Start worker processes on this machine.
+
+    :param count: Number of workers
+    :param address: Tuple (host, port) of the coordinator
+    :param authkey: Bytes held by the coordinator, as Coordinator.authkey
+    :return: List of subprocess.Popen instances
+    """
+    host, port = address
+    if host in ("", "0.0.0.0"):
+        host = "127.0.0.1"
+
+    env = dict(os.environ)
+    env[AUTHKEY_VARIABLE] = binascii.hexlify(authkey).decode("ascii")
+    script = os.path.splitext(os.path.abspath(__file__))[0] + ".py"
+    return [
+        subprocess.Popen(
+            [sys.executable, script, "worker", host, str(port)],
+            cwd=os.path.dirname(script), env=env)
+        for _ in range(count)
+    ]
+
+
+def _answer(authkey, role, challenge):
+    """Return answer proving that role holds authkey, to a challenge."""
+    return hmac.new(authkey, role.encode("ascii") + challenge,
+                    hashlib.sha256).digest()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != "worker":
+        sys.exit("Usage: python distributed.py worker <host> <port>")
+    if AUTHKEY_VARIABLE not in os.environ:
+        sys.exit("Set %s to the coordinator's authkey, in hex"
+                 % AUTHKEY_VARIABLE)
+    authkey = binascii.unhexlify(os.environ[AUTHKEY_VARIABLE])
+
+    # Fractals require a QApplication, but workers need no display.
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv[:1])
+
+    work(sys.argv[2], int(sys.argv[3]), authkey)
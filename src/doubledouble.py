@@ -0,0 +1,227 @@
+"""
+Double-double arithmetic on NumPy arrays.
+
+Each value is held as an unevaluated sum hi + lo of float64s with
+|lo| <= ulp(hi) / 2, giving about 106 bits of precision: enough to tell
+pixels apart in views down to about 1e-28 wide, at several times the cost of
+float64. Sums and products are made exact with error-free transformations
+(Knuth's two-sum and Dekker's product), which NumPy evaluates without
+excess precision.
+"""
+import numpy as np
+
+
+# 2**27 + 1, splitting a float64 into two halves of 26 bits.
+_SPLITTER = 134217729.0
+
+
+def twoSum(a, b):
+    """Return (s, e) such that s = fl(a + b) and s + e = a + b exactly."""
+    s = a + b
+    bb = s - a
+    e = (a - (s - bb)) + (b - bb)
+    return s, e
+
+
+def quickTwoSum(a, b):
+    """As twoSum, provided that |a| >= |b|."""
+    s = a + b
+    e = b - (s - a)
+    return s, e
+
+
+def split(a):
+    """Return (hi, lo) such that hi + lo = a, each with at most 26 bits."""
+    t = _SPLITTER * a
+    hi = t - (t - a)
+    return hi, a - hi
+
+
+def twoProduct(a, b):
+    """Return (p, e) such that p = fl(a * b) and p + e = a * b exactly."""
+    p = a * b
+    a_hi, a_lo = split(a)
+    b_hi, b_lo = split(b)
+    e = ((a_hi * b_hi - p) + a_hi * b_lo + a_lo * b_hi) + a_lo * b_lo
+    return p, e
+
+
+def add(a_hi, a_lo, b_hi, b_lo):
+    """Return sum of two double-doubles."""
+    s, e = twoSum(a_hi, b_hi)
+    t, f = twoSum(a_lo, b_lo)
+    s, e = quickTwoSum(s, e + t)
+    return quickTwoSum(s, e + f)
+
+
+def multiply(a_hi, a_lo, b_hi, b_lo):
+    """Return product of two double-doubles."""
+    p, e = twoProduct(a_hi, b_hi)
+    return quickTwoSum(p, e + (a_hi * b_lo + a_lo * b_hi))
+
+
+def divide(a_hi, a_lo, b_hi, b_lo):
+    """Return quotient of two double-doubles, by long division."""
+    q1 = a_hi / b_hi
+    r_hi, r_lo = add(a_hi, a_lo, *(-x for x in multiply(q1, 0.0, b_hi, b_lo)))
+    q2 = r_hi / b_hi
+    r_hi, r_lo = add(r_hi, r_lo, *(-x for x in multiply(q2, 0.0, b_hi, b_lo)))
+    q3 = r_hi / b_hi
+    q1, q2 = quickTwoSum(q1, q2)
+    return add(q1, q2, q3, 0.0)
+
+
+class DDComplex(object):
+    """
+    Array of complex numbers whose real and imaginary parts are each held
+    as double-doubles.
+
+    Supports the operations the fractals iterate with: addition,
+    subtraction and multiplication by DDComplex arrays or by complex values,
+    squaring, reciprocals and integer powers. np.asarray() rounds to
+    complex128.
+    """
+
+    __slots__ = ("reHi", "reLo", "imHi", "imLo")
+
+    # Have NumPy defer to DDComplex's reflected operators, e.g. for
+    # ndarray + DDComplex.
+    __array_ufunc__ = None
+
+    def __init__(self, re_hi, re_lo, im_hi, im_lo):
+        self.reHi = re_hi
+        self.reLo = re_lo
+        self.imHi = im_hi
+        self.imLo = im_lo
+
+    @staticmethod
+    def fromComplex(z):
+        """Return DDComplex array equal to a complex value or array."""
+        z = np.asarray(z, dtype=complex)
+        return DDComplex(
+            z.real.copy(), np.zeros(z.shape), z.imag.copy(), np.zeros(z.shape))
+
+    def __getstate__(self):
+        return (self.reHi, self.reLo, self.imHi, self.imLo)
+
+    def __setstate__(self, state):
+        self.reHi, self.reLo, self.imHi, self.imLo = state
+
+    @property
+    def shape(self):
+        return np.shape(self.reHi)
+
+    @property
+    def size(self):
+        return np.size(self.reHi)
+
+    def __array__(self, dtype=None):
+        z = (self.reHi + self.reLo) + (self.imHi + self.imLo) * 1j
+        return np.asarray(z, dtype=dtype)
+
+    def __getitem__(self, index):
+        return self._map(lambda a: a[index])
+
+    def reshape(self, *shape):
+        return self._map(lambda a: a.reshape(*shape))
+
+    def repeat(self, repeats):
+        return self._map(lambda a: a.repeat(repeats))
+
+    def copy(self):
+        return self._map(np.copy)
+
+    def key(self):
+        """Return hashable value of a single DDComplex number."""
+        return (float(self.reHi), float(self.reLo),
+                float(self.imHi), float(self.imLo))
+
+    def absolute(self):
+        """Return magnitudes, rounded to float64."""
+        return np.hypot(self.reHi, self.imHi)
+
+    def __add__(self, other):
+        other = _asDDComplex(other)
+        return DDComplex(
+            *(add(self.reHi, self.reLo, other.reHi, other.reLo)
+              + add(self.imHi, self.imLo, other.imHi, other.imLo)))
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return DDComplex(-self.reHi, -self.reLo, -self.imHi, -self.imLo)
+
+    def __sub__(self, other):
+        return self + -_asDDComplex(other)
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        other = _asDDComplex(other)
+        ac = multiply(self.reHi, self.reLo, other.reHi, other.reLo)
+        bd = multiply(self.imHi, self.imLo, other.imHi, other.imLo)
+        ad = multiply(self.reHi, self.reLo, other.imHi, other.imLo)
+        bc = multiply(self.imHi, self.imLo, other.reHi, other.reLo)
+        return DDComplex(
+            *(add(ac[0], ac[1], -bd[0], -bd[1]) + add(*(ad + bc))))
+
+    __rmul__ = __mul__
+
+    def square(self):
+        a, b = self.reHi, self.imHi
+        a_hi, a_lo = split(a)
+        b_hi, b_lo = split(b)
+
+        # As twoProduct, sharing the splits of a and b.
+        aa = a * a
+        aa_e = ((a_hi * a_hi - aa) + 2 * a_hi * a_lo) + a_lo * a_lo
+        aa, aa_e = quickTwoSum(aa, aa_e + 2 * a * self.reLo)
+        bb = b * b
+        bb_e = ((b_hi * b_hi - bb) + 2 * b_hi * b_lo) + b_lo * b_lo
+        bb, bb_e = quickTwoSum(bb, bb_e + 2 * b * self.imLo)
+        ab = a * b
+        ab_e = ((a_hi * b_hi - ab) + a_hi * b_lo + a_lo * b_hi) + a_lo * b_lo
+        ab, ab_e = quickTwoSum(ab, ab_e + (a * self.imLo + self.reLo * b))
+
+        return DDComplex(*(add(aa, aa_e, -bb, -bb_e) + (2 * ab, 2 * ab_e)))
+
+    def reciprocal(self):
+        """Return 1 / z, as conj(z) / |z|^2."""
+        norm = add(*(multiply(self.reHi, self.reLo, self.reHi, self.reLo)
+                     + multiply(self.imHi, self.imLo, self.imHi, self.imLo)))
+        return DDComplex(*(divide(self.reHi, self.reLo, *norm)
+                           + divide(-self.imHi, -self.imLo, *norm)))
+
+    def __pow__(self, exponent):
+        """Return power by an integer, by repeated squaring."""
+        if exponent != int(exponent):
+            raise ValueError(
+                "Only integer powers are supported, not %s" % exponent)
+
+        exponent = int(exponent)
+        if exponent < 0:
+            return (self ** -exponent).reciprocal()
+        if exponent == 0:
+            return DDComplex.fromComplex(np.ones(self.shape))
+
+        result = None
+        base = self
+        while exponent:
+            if exponent & 1:
+                result = base if result is None else result * base
+            exponent >>= 1
+            if exponent:
+                base = base.square()
+        return result
+
+    def _map(self, function):
+        """Return DDComplex with function applied to each component."""
+        return DDComplex(function(self.reHi), function(self.reLo),
+                         function(self.imHi), function(self.imLo))
+
+
+def _asDDComplex(value):
+    if isinstance(value, DDComplex):
+        return value
+    return DDComplex.fromComplex(value)
@@ -0,0 +1,375 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from controls import Option
+from controls import OptionSelect
+from controls import ValueControl
+from fractal import Fractal
+from fractalresult import FractalResult
+import utils
+
+
+# Orbits accumulated into the image.
+BUDDHABROT = Option("Buddhabrot")
+ANTI_BUDDHABROT = Option("Anti-Buddhabrot")
+NEBULABROT = Option("Nebulabrot")
+MODES = [BUDDHABROT, ANTI_BUDDHABROT, NEBULABROT]
+
+# Distributions from which values of c are drawn.
+UNIFORM = Option("Uniform Sampling")
+METROPOLIS = Option("Metropolis-Hastings Sampling")
+SAMPLERS = [UNIFORM, METROPOLIS]
+
+
+class Buddhabrot(Fractal):
+    """
+    Density of the orbits z -> z^2 + c, for c sampled across the plane.
+
+    The Buddhabrot accumulates orbits which escape, the Anti-Buddhabrot
+    orbits which remain bounded, and the Nebulabrot escaping orbits within
+    three iteration limits, shown as red, green and blue.
+    """
+
+    # Static constants.
+    BATCH_SIZE = 1 << 15
+    BATCHES_PER_TASK = 16
+
+    # Metropolis-Hastings chains run side by side in each task, and steps of
+    # each dropped before their orbits are accumulated.
+    METROPOLIS_CHAINS = 1 << 13
+    METROPOLIS_BURN_IN = 12
+
+    # Iteration limits of the Nebulabrot's channels, as fractions of itermax.
+    NEBULA_LIMITS = (1.0, 0.1, 0.02)
+
+    def __init__(self, name):
+        super(Buddhabrot, self).__init__(name)
+        self.itermax = 200
+
+        # Worker processes; defaults to the number of CPUs.
+        self.processes = None
+
+        # Optional .npz file saving progress, so that long renders resume.
+        self.checkpoint = None
+
+    def _computeFractal(self, complex_plane, itermax, mode=BUDDHABROT,
+                        sampler=UNIFORM, samples=1.0):
+        """
+        Return histogram of orbit points within the plane.
+
+        :param samples: Millions of values of c to sample
+        :return: Result whose counts have shape (channels, n, m)
+        """
+        plane = np.asarray(complex_plane)
+        n, m = plane.shape
+        xmin, ymin = plane[0, 0].real, plane[0, 0].imag
+        dx = (plane[-1, 0].real - xmin) / (n - 1) if n > 1 else 1.0
+        dy = (plane[0, -1].imag - ymin) / (m - 1) if m > 1 else 1.0
+        view = (xmin, ymin, dx, dy, n, m)
+
+        if mode is NEBULABROT:
+            limits = tuple(
+                max(1, int(itermax * f)) for f in Buddhabrot.NEBULA_LIMITS)
+        else:
+            limits = (itermax,)
+        bounded = mode is ANTI_BUDDHABROT
+
+        task_samples = Buddhabrot.BATCH_SIZE * Buddhabrot.BATCHES_PER_TASK
+        task_count = max(1, int(round(samples * 1e6 / task_samples)))
+        key = repr((view, limits, bounded, sampler.name, task_count))
+        tasks = [
+            (view, limits, bounded, sampler is METROPOLIS, seed)
+            for seed in range(task_count)
+        ]
+
+        histogram, done = self._loadCheckpoint(key, len(limits), n * m)
+        tasks = [task for task in tasks if task[-1] not in done]
+
+        if self.processes == 1 or len(tasks) <= 1:
+            results = (_accumulate(task) for task in tasks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            results = pool.imap_unordered(_accumulate, tasks)
+
+        try:
+            # Merge each worker's histogram as soon as it is done.
+            for seed, task_histogram in results:
+                histogram += task_histogram
+                done.add(seed)
+                self._saveCheckpoint(key, histogram, done)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        counts = histogram.reshape(len(limits), n, m)
+        return FractalResult(
+            counts=counts.astype(FractalResult.countType(counts.max())))
+
+    def _loadCheckpoint(self, key, channels, pixels):
+        """Return (histogram, set of completed seeds) saved for given key."""
+        histogram = np.zeros((channels, pixels), dtype=np.int64)
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with np.load(self.checkpoint) as saved:
+                if str(saved["key"]) == key:
+                    return saved["histogram"], set(saved["done"].tolist())
+        return histogram, set()
+
+    def _saveCheckpoint(self, key, histogram, done):
+        if not self.checkpoint:
+            return
+
+        # Write atomically, so that an interrupted save keeps prior progress.
+        partial = self.checkpoint + ".partial.npz"
+        np.savez(partial, key=np.array(key), histogram=histogram,
+            done=np.array(sorted(done), dtype=np.int64))
+        os.rename(partial, self.checkpoint)
+
+    def _toRgbImage(self, fractal, colors, color_offset, normalization):
+        """
+        Convert the generated fractal into an RGB image array.
+
+        :param colors: Number of colors permitted in image
+        :param color_offset: Default offset for generating color hues
+        :param normalization: Normalization of the frame the fractal is part
+                              of
+        :return: ndarry of shape (n, m, 3)
+        """
+        values, amax = self._colorValues(fractal, normalization)
+        if not self.equalizeHistogram:
+            # Square root brings out faint orbits.
+            values, amax = np.sqrt(values), np.sqrt(amax)
+        amax = np.broadcast_to(amax, values.shape[:-2])
+        channels = [
+            utils.adjustRange(channel, amax=channel_max)
+            for channel, channel_max in zip(values, amax)
+        ]
+        if len(channels) == 1:
+            channels *= 3
+
+        rgb_image = np.array(channels).astype(dtype=np.uint8)
+        return rgb_image.T
+
+    def _isPointwise(self, **kwargs):
+        """Return whether each pixel is computed independently of others,
+           so that any subset of the plane may be computed on its own."""
+        return False
+
+    def _createControls(self):
+        """Create UI for editing fractal generation parameters."""
+        mode_control = OptionSelect("mode", BUDDHABROT, MODES)
+        sampler_control = OptionSelect("sampler", UNIFORM, SAMPLERS)
+        samples_control = ValueControl(
+            "samples", vmin=0, vmax=100, default=1, precision=1)
+        self.controls.addControl("Orbits", mode_control)
+        self.controls.addControl("Sampling", sampler_control)
+        self.controls.addControl("Samples (Millions)", samples_control)
+
+    def defaultZoom(self):
+        """Return tuple, (xmin, ymin, xmax, ymax), representing default
+           zoom level for this fractal."""
+        return [-2.0, -1.5, 1.0, 1.5]
+
+
+# {{{ - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+# }}} Worker Functions
+#
+# Module level, so that they may be run by multiprocessing.
+
+def _accumulate(task):
+    """
+    Return (seed, histogram) of orbits from one task's worth of samples.
+
+    :param task: Tuple (view, limits, bounded, metropolis, seed)
+    """
+    view, limits, bounded, metropolis, seed = task
+    rng = np.random.RandomState(seed)
+    histogram = np.zeros((len(limits), view[4] * view[5]), dtype=np.uint32)
+    if metropolis:
+        _sampleMetropolis(rng, view, limits, bounded, histogram)
+    else:
+        for _ in range(Buddhabrot.BATCHES_PER_TASK):
+            c = _uniformSamples(rng, Buddhabrot.BATCH_SIZE)
+            times = _escapeTimes(c, limits[0], bounded)
+            for channel, limit in enumerate(limits):
+                selected, steps = _selectOrbits(times, limit, bounded)
+                _traceOrbits(c[selected], steps, view, histogram[channel])
+    return seed, histogram
+
+
+def _sampleMetropolis(rng, view, limits, bounded, histogram):
+    """
+    Accumulate orbits of c sampled in proportion to the number of their
+    points lying within the view, using Metropolis-Hastings chains.
+
+    Chains start from a uniform pool of BATCH_SIZE samples, resampled in
+    proportion to their contributions, so they begin near the target
+    distribution; their first METROPOLIS_BURN_IN steps are still dropped.
+    Each later step splats its orbit with weight proportional to 1 /
+    contribution, rounded stochastically to a whole number of times, and
+    scaled by the pool's mean contribution so that the histogram is that of
+    a task's worth of uniform samples; most samples are nonetheless spent
+    where the view's orbits come from.
+    """
+    xmin, ymin, dx, dy, n, m = view
+    chains = Buddhabrot.METROPOLIS_CHAINS
+    task_samples = Buddhabrot.BATCH_SIZE * Buddhabrot.BATCHES_PER_TASK
+    steps = (task_samples - Buddhabrot.BATCH_SIZE) // chains
+    mutation = 0.05 * max(dx * n, dy * m)
+
+    def contributions(c):
+        times = _escapeTimes(c, limits[0], bounded)
+        selected, orbit_steps = _selectOrbits(times, limits[0], bounded)
+        counts = np.zeros(c.size, dtype=np.int64)
+        counts[selected] = _traceOrbits(c[selected], orbit_steps, view)
+        return counts, times
+
+    pool = _uniformSamples(rng, Buddhabrot.BATCH_SIZE)
+    pool_counts, pool_times = contributions(pool)
+    if not pool_counts.any():
+        # No orbit of the pool reaches the view.
+        return
+    splats = chains * (steps - Buddhabrot.METROPOLIS_BURN_IN)
+    scale = pool_counts.mean() * task_samples / float(splats)
+    start = rng.choice(
+        pool.size, chains, p=pool_counts / float(pool_counts.sum()))
+    c, counts, times = pool[start], pool_counts[start], pool_times[start]
+
+    for step in range(steps):
+        # Mostly small mutations, with occasional fresh samples so that
+        # chains do not get stuck on a single region.
+        proposed = c + mutation * (
+            rng.standard_normal(c.size) + 1j * rng.standard_normal(c.size))
+        fresh = rng.random_sample(c.size) < 0.2
+        proposed[fresh] = _uniformSamples(rng, fresh.sum())
+        proposed_counts, proposed_times = contributions(proposed)
+
+        # Uniform samples are drawn from the square |Re|, |Im| <= 2 alone.
+        outside = ((np.absolute(proposed.real) > 2)
+                   | (np.absolute(proposed.imag) > 2))
+        proposed_counts[outside] = 0
+
+        # Both kinds of proposal are symmetric, so acceptance depends only on
+        # the ratio of contributions.
+        accepted = rng.random_sample(c.size) * counts < proposed_counts
+        c[accepted] = proposed[accepted]
+        counts[accepted] = proposed_counts[accepted]
+        times[accepted] = proposed_times[accepted]
+        if step < Buddhabrot.METROPOLIS_BURN_IN:
+            continue
+
+        repeats = np.floor(
+            scale / counts + rng.random_sample(c.size)).astype(np.int64)
+        splatted = np.repeat(np.arange(c.size), repeats)
+        for channel, limit in enumerate(limits):
+            selected, orbit_steps = _selectOrbits(
+                times[splatted], limit, bounded)
+            _traceOrbits(c[splatted][selected], orbit_steps, view,
+                         histogram[channel])
+
+
+def _uniformSamples(rng, size):
+    """Return values of c drawn uniformly from the square |Re|, |Im| <= 2."""
+    return rng.uniform(-2, 2, size) + 1j * rng.uniform(-2, 2, size)
+
+
+def _escapeTimes(c, limit, bounded):
+    """
+    Return iteration, from 1 to limit, at which each orbit escapes |z| > 2,
+    or limit + 1 if it remains bounded.
+
+    :param bounded: Whether bounded orbits are wanted; if not, c within the
+                    main cardioid or period-2 bulb is skipped, as these never
+                    escape.
+    """
+    times = np.full(c.shape, limit + 1, dtype=np.int64)
+    remaining = np.arange(c.size)
+    if not bounded:
+        x, y = c.real, c.imag
+        q = (x - 0.25) ** 2 + y ** 2
+        interior = (q * (q + x - 0.25) < 0.25 * y ** 2)
+        interior |= ((x + 1) ** 2 + y ** 2 < 0.0625)
+        remaining = remaining[~interior]
+
+    # Iterate remaining orbits only, dropping those which escape.
+    orbit_c = c[remaining]
+    z = np.zeros_like(orbit_c)
+    for i in xrange(limit):
+        z = np.square(z) + orbit_c
+        escaped = (np.square(z.real) + np.square(z.imag)) > 4.0
+        if escaped.any():
+            times[remaining[escaped]] = i + 1
+            still_bounded = ~escaped
+            remaining = remaining[still_bounded]
+            orbit_c = orbit_c[still_bounded]
+            z = z[still_bounded]
+            if not remaining.size:
+                break
+
+    return times
+
+
+def _selectOrbits(times, limit, bounded):
+    """Return (mask of orbits, number of points of each selected orbit)."""
+    if bounded:
+        selected = times > limit
+        return selected, np.full(selected.sum(), limit, dtype=np.int64)
+    selected = times <= limit
+    return selected, times[selected]
+
+
+def _traceOrbits(c, steps, view, histogram=None):
+    """
+    Iterate orbits of c, counting points z_1 ... z_steps which lie within the
+    view.
+
+    :param view: Tuple (xmin, ymin, dx, dy, n, m)
+    :param histogram: Optional flat array of size n * m, to which each
+                      point's pixel is added
+    :return: Number of points of each orbit within the view
+    """
+    xmin, ymin, dx, dy, n, m = view
+    counts = np.zeros(c.size, dtype=np.int64)
+    if not c.size:
+        return counts
+
+    # Sort longest orbits first, so that those still running are a prefix.
+    order = np.argsort(-steps, kind='mergesort')
+    c = c[order]
+    descending = -steps[order]
+
+    z = np.zeros_like(c)
+    pixels = []
+    pending = 0
+    for i in xrange(-descending[0]):
+        running = np.searchsorted(descending, -i, side='left')
+        z = np.square(z[:running]) + c[:running]
+
+        ix = np.floor((z.real - xmin) / dx + 0.5)
+        iy = np.floor((z.imag - ymin) / dy + 0.5)
+        in_view = (ix >= 0) & (ix < n) & (iy >= 0) & (iy < m)
+        counts[:running] += in_view
+
+        if histogram is not None:
+            pixels.append((ix[in_view] * m + iy[in_view]).astype(np.int64))
+            pending += pixels[-1].size
+            if pending > histogram.size:
+                _splat(histogram, pixels)
+                pixels, pending = [], 0
+
+    if histogram is not None:
+        _splat(histogram, pixels)
+
+    unsorted = np.empty_like(counts)
+    unsorted[order] = counts
+    return unsorted
+
+
+def _splat(histogram, pixels):
+    """Add occurrences of flat pixel indices to histogram."""
+    if pixels:
+        histogram += np.bincount(
+            np.concatenate(pixels), minlength=histogram.size
+        ).astype(histogram.dtype)
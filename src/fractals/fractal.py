@@ -7,7 +7,12 @@ from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QImage
 from PyQt5.QtGui import QPixmap
 
+from cache import LruCache
 from controls import ControlsInterface
+from doubledouble import DDComplex
+from fractalresult import FractalResult
+from normalization import Normalization
+from pyramid import Pyramid
 import utils
 
 
@@ -21,6 +26,38 @@ class Fractal(QObject):
     FRACTALS = []
     _ID = 0
 
+    # Difference between neighbouring raw values beyond which pixels are 
+    # antialiased; independent of the view, so that tiles agree.
+    AA_THRESHOLD = 0.5
+
+    # Memory allowed for caching tiles of each fractal.
+    PYRAMID_BYTES = 128 << 20
+
+    # Memory allowed for caching whole views of each fractal, e.g. those
+    # prefetched while the GUI is idle.
+    RESULT_BYTES = 32 << 20
+
+    # Columns computed between checks for cancelled prefetching.
+    PREFETCH_BAND = 32
+
+    # Whether the fractal can be computed in double-double precision, and
+    # the view width below which it is; narrower views would otherwise have
+    # pixels indistinguishable in float64.
+    DOUBLE_DOUBLE = False
+    DOUBLE_DOUBLE_WIDTH = 1e-13
+
+    # Whether image rows follow the real axis rather than the imaginary
+    # axis, as the Pheonix fractal's always have.
+    TRANSPOSED = False
+
+    # Whether colours are scaled by statistics of the whole frame, such as
+    # its maximum, rather than by fixed ranges alone.
+    FRAME_SCALED = True
+
+    # Symmetries of computed fractals, as the axes they negate.
+    CONJUGATE_SYMMETRY = (1,)           # About the real axis.
+    POINT_SYMMETRY = (0, 1)             # About the origin, z -> -z.
+
     def __init__(self, name):
         super(Fractal, self).__init__()
 
@@ -28,12 +65,23 @@ class Fractal(QObject):
         self.name = name
 
         # Initialize default values.
+        self.doubleDouble = False
+        self.viewOrigin = DDComplex.fromComplex(0)
         self.resetZoom()
         self.xres = 300
         self.yres = 300
         self.itermax = 50
         self.colors = 5
         self.colorOffset = 0
+        self.equalizeHistogram = False
+        # Normalization pinning colours, e.g. across an animation's frames;
+        # None to normalize each frame by itself.
+        self.normalization = None
+        self.aaSamples = 16
+        self.aaThreshold = self.AA_THRESHOLD
+        self.usePyramid = False
+        self._pyramid = None
+        self._results = LruCache(Fractal.RESULT_BYTES)
 
         # Create UI.
         self.controls = ControlsInterface()
@@ -45,13 +93,8 @@ class Fractal(QObject):
         Fractal._ID += 1
 
     def render(self):
-        """Create RGB image representing fractal."""        
-        complex_plane = self._complexPlane(
-            self.xres, self.yres, self.xmin, self.ymin, self.xmax, self.ymax)
-        kwargs = self.controls.args()
-        fractal = self._computeFractal(complex_plane, self.itermax, **kwargs)
-        rgb_image = self._toRgbImage(fractal, self.colors, self.colorOffset)
-        rgb_image = np.ascontiguousarray(rgb_image)
+        """Create RGB image representing fractal."""
+        rgb_image = self.image()
 
         # Convert RGB image (numpy array) to QPixmap.
         height, width, channel = rgb_image.shape
@@ -63,15 +106,316 @@ class Fractal(QObject):
         # Update listeners.
         self.renderFinished.emit(pixmap)
 
-    def _toRgbImage(self, fractal, colors, color_offset):
+    def image(self, **kwargs):
+        """
+        Return RGB image array of the current view.
+
+        :param kwargs: Values overriding those entered in the controls
+        :return: Contiguous ndarray of shape (yres, xres, 3), or
+                 (xres, yres, 3) if TRANSPOSED
+        """
+        fractal = self.computeView(self.view(), **kwargs)
+        return self.colorize(fractal)
+
+    def colorize(self, fractal, normalization=None):
+        """
+        Return contiguous RGB image array of a computed fractal.
+
+        :param normalization: Normalization shared with the other tiles or
+                              frames being colorized; defaults to
+                              self.normalization, else that of the fractal
+                              itself
+        """
+        if normalization is None:
+            normalization = self.normalization
+        if normalization is None:
+            normalization = Normalization.fromResult(
+                fractal, self.equalizeHistogram)
+        rgb_image = self._toRgbImage(
+            fractal, self.colors, self.colorOffset, normalization)
+        return np.ascontiguousarray(rgb_image)
+
+    def needsNormalization(self):
+        """Return whether tiles are only colorized alike given statistics 
+           of their whole frame, merged into a Normalization."""
+        return self.FRAME_SCALED or self.equalizeHistogram
+
+    def computeView(self, view, **kwargs):
+        """
+        Return raw fractal over the whole of a view, reusing the result of 
+        an earlier or prefetched computation of the same view.
+
+        :param view: Tuple (xmin, ymin, xmax, ymax)
+        :param kwargs: Values overriding those entered in the controls
+        :return: FractalResult of shape (..., xres, yres)
+        """
+        args = self.controls.args()
+        args.update(kwargs)
+
+        frame = self.frame(view)
+        key = self._resultKey(frame, args)
+        fractal = self._results.get(key)
+        if fractal is None:
+            fractal = self._computeTile(
+                frame, 0, 0, self.xres, self.yres, args)
+            self._results.put(key, fractal)
+        return fractal
+
+    def frame(self, view=None):
+        """
+        Return tuple (view, viewOrigin, doubleDouble, xres, yres) fixing the 
+        plane a view is computed over, so that it may be computed later or 
+        from another thread whatever the fractal is showing by then.
+
+        :param view: Tuple (xmin, ymin, xmax, ymax); defaults to the 
+                     current view
+        """
+        if view is None:
+            view = self.view()
+        return (tuple(view), self.viewOrigin, self.doubleDouble, 
+                self.xres, self.yres)
+
+    def prefetchView(self, frame, cancelled, **kwargs):
+        """
+        Compute a view into the result cache band by band, so that a later 
+        computeView of it is instant. May be called from another thread.
+
+        :param frame: Tuple as from frame()
+        :param cancelled: Function returning True once prefetching should 
+                          stop; checked between bands
+        :param kwargs: Values of every control
+        :return: Whether the view is now cached
+        """
+        key = self._resultKey(frame, kwargs)
+        if self._results.get(key) is not None:
+            return True
+        if not self._isPointwise(**kwargs):
+            # Computing bands on their own would not give the same result.
+            return False
+
+        xres, yres = frame[3:]
+        bands = []
+        for y0 in range(0, yres, Fractal.PREFETCH_BAND):
+            if cancelled():
+                return False
+            y1 = min(y0 + Fractal.PREFETCH_BAND, yres)
+            bands.append(self._computeTile(frame, 0, y0, xres, y1, kwargs))
+
+        if cancelled():
+            return False
+        self._results.put(key, FractalResult.concatenate(bands, axis=-1))
+        return True
+
+    def computeTile(self, x0, y0, x1, y1, **kwargs):
+        """
+        Return raw fractal for pixels [x0, x1) x [y0, y1) of the current view.
+
+        Tiles are antialiased with a one pixel border, so that edges along 
+        the tile's sides are still detected.
+
+        :param kwargs: Values overriding those entered in the controls
+        :return: FractalResult of shape (..., x1 - x0, y1 - y0)
+        """
+        args = self.controls.args()
+        args.update(kwargs)
+        return self._computeTile(self.frame(), x0, y0, x1, y1, args)
+
+    def computeBands(self, size, axis, **kwargs):
+        """
+        Yield (start, stop, raw fractal) for consecutive bands of the
+        current view, each spanning at most size pixels along an axis.
+
+        Fractals whose pixels depend on one another, see _isPointwise, are
+        computed in one pass and sliced into bands, as computing bands on
+        their own would not give the same result.
+
+        :param axis: 0 for bands of pixels [start, stop) of x, 1 of y
+        :param kwargs: Values overriding those entered in the controls
+        """
+        args = self.controls.args()
+        args.update(kwargs)
+        frame = self.frame()
+        shape = (self.xres, self.yres)
+        whole = None
+        if not self._isPointwise(**args):
+            whole = self._computeTile(frame, 0, 0, shape[0], shape[1], args)
+
+        for start in range(0, shape[axis], size):
+            stop = min(start + size, shape[axis])
+            if axis:
+                tile = (0, start, shape[0], stop)
+            else:
+                tile = (start, 0, stop, shape[1])
+
+            if whole is None:
+                yield start, stop, self._computeTile(frame, *(tile + (args,)))
+            else:
+                yield start, stop, whole[
+                    ..., tile[0]:tile[2], tile[1]:tile[3]]
+
+    def _computeTile(self, frame, x0, y0, x1, y1, args):
+        """Return raw fractal for pixels [x0, x1) x [y0, y1) of a frame, as 
+           from frame(), given the values of every control."""
+        view, view_origin, double_double, xres, yres = frame
+        xmin, ymin, xmax, ymax = view
+        dx = float(xmax - xmin) / max(xres - 1, 1)
+        dy = float(ymax - ymin) / max(yres - 1, 1)
+
+        # Extend tile by one pixel where the view allows.
+        bx0, by0 = max(x0 - 1, 0), max(y0 - 1, 0)
+        bx1, by1 = min(x1 + 1, xres), min(y1 + 1, yres)
+        bounds = (
+            bx1 - bx0, by1 - by0,
+            xmin + bx0 * dx, ymin + by0 * dy,
+            xmin + (bx1 - 1) * dx, ymin + (by1 - 1) * dy)
+        complex_plane = self._complexPlane(
+            *bounds, origin=view_origin if double_double else None)
+
+        fractal = None
+        if (self.usePyramid and not double_double
+                and self._isPointwise(**args)):
+            fractal = self._composeRaw(
+                bounds, (xres, yres), self.itermax, **args)
+        if fractal is None:
+            fractal = self._computeSymmetric(
+                bounds, complex_plane, self.itermax, **args)
+        fractal = self._antialias(
+            fractal, complex_plane, (dx, dy), self.itermax, **args)
+        return fractal[..., x0 - bx0:x1 - bx0, y0 - by0:y1 - by0]
+
+    def _resultKey(self, frame, args):
+        """Return key identifying the raw fractal of a frame in the result 
+           cache."""
+        view, view_origin, double_double, xres, yres = frame
+        return (view, view_origin.key(), double_double, xres, yres,
+                self.itermax, self.aaSamples, self.aaThreshold, 
+                self.usePyramid, tuple(sorted(args.items())))
+
+    def _computeRaw(self, complex_plane, itermax, **kwargs):
+        """Return computed fractal as a FractalResult; any channels (e.g. 
+           the Nebulabrot's) lead the pixel axes."""
+        return self._computeFractal(complex_plane, itermax, **kwargs)
+
+    def _composeRaw(self, bounds, resolution, itermax, **kwargs):
+        """
+        Return computed fractal, reusing tiles cached in the pyramid, or 
+        None if the plane's pixels are not lattice points of the pyramid.
+
+        The pyramid's level 0 matches the default zoom, so resetting the zoom 
+        is exact, as are views zoomed or panned by whole lattice points of a 
+        level. Other views would only approximate the fractal, taking the 
+        nearest lattice point, and are left to be computed exactly.
+
+        :param bounds: Tuple (n, m, xmin, ymin, xmax, ymax) of the plane
+        :param resolution: Tuple (xres, yres) of the whole view
+        """
+        pyramid = self._tilePyramid(resolution)
+        if not pyramid.isAligned(*bounds):
+            return None
+
+        key = (itermax, tuple(sorted(kwargs.items())))
+        return pyramid.compose(
+            *bounds, key=key, complex_plane=self._complexPlane,
+            compute=lambda plane: self._computeRaw(plane, itermax, **kwargs),
+            symmetry=self._symmetry(**kwargs))
+
+    def _tilePyramid(self, resolution):
+        """Return pyramid whose level 0 lattice points are the pixels of the
+           default zoom at given resolution, (xres, yres)."""
+        xmin, ymin, xmax, ymax = self.defaultZoom()
+        xres, yres = resolution
+        origin = (xmin, ymin)
+        spacing = (float(xmax - xmin) / max(xres - 1, 1),
+                   float(ymax - ymin) / max(yres - 1, 1))
+        if (self._pyramid is None or self._pyramid.origin != origin
+                or self._pyramid.spacing != spacing):
+            self._pyramid = Pyramid(origin, spacing, Fractal.PYRAMID_BYTES)
+        return self._pyramid
+
+    def _computeSymmetric(self, bounds, complex_plane, itermax, **kwargs):
+        """
+        Return computed fractal, computing only one pixel of each pair 
+        mirroring one another under the fractal's symmetry.
+
+        :param bounds: Tuple (n, m, xmin, ymin, xmax, ymax) of complex_plane
+        """
+        symmetry = self._symmetry(**kwargs)
+        mirrored = None
+        # Double-double views are relative to an origin off the axes.
+        if (symmetry is not None and not isinstance(complex_plane, DDComplex)
+                and self._isPointwise(**kwargs)):
+            mirrored = utils.mirrorPixels(bounds, symmetry)
+        if mirrored is None:
+            return self._computeRaw(complex_plane, itermax, **kwargs)
+
+        mask, source_i, source_j = mirrored
+        values = self._computePoints(complex_plane[~mask], itermax, **kwargs)
+        fractal = values.empty(mask.shape)
+        fractal[..., ~mask] = values
+        fractal[..., mask] = fractal[..., source_i, source_j]
+        return fractal
+
+    def _computePoints(self, points, itermax, **kwargs):
+        """Return computed fractal for a flat array of points."""
+        raw = self._computeRaw(points.reshape(-1, 1), itermax, **kwargs)
+        return raw.reshape(raw.shape[:-2] + (-1,))
+
+    def _antialias(self, fractal, complex_plane, pixel_size, itermax,
+                   **kwargs):
+        """
+        Supersample pixels lying on edges of the computed fractal.
+
+        Only pixels differing sharply from a neighbour are recomputed, at 
+        jittered sub-pixel offsets, and replaced by the mean of their 
+        samples (roots by the most frequent); flat regions cost nothing 
+        extra.
+
+        :param fractal: Raw fractal computed over complex_plane
+        :param pixel_size: Tuple (dx, dy), distance between the view's pixels
+        :return: Raw fractal with edge pixels blended
+        """
+        if self.aaSamples < 2 or not self._isPointwise(**kwargs):
+            return fractal
+
+        edges = utils.edgeMask(fractal.components(), self.aaThreshold)
+        if not edges.any():
+            return fractal
+
+        dx, dy = pixel_size
+        offsets = utils.jitterOffsets(self.aaSamples)
+        offsets = offsets.real * dx + offsets.imag * dy * complex(0, 1)
+
+        # Compute every sample of every edge pixel in a single pass.
+        points = complex_plane[edges]
+        samples = points.repeat(offsets.size) + np.tile(offsets, points.size)
+        values = self._computePoints(samples, itermax, **kwargs)
+        values = values.reshape(values.shape[:-1] + (points.size, offsets.size))
+
+        fractal[..., edges] = values.mean()
+        return fractal
+
+    def _isPointwise(self, **kwargs):
+        """Return whether each pixel is computed independently of others, 
+           so that any subset of the plane may be computed on its own."""
+        return True
+
+    def _symmetry(self, **kwargs):
+        """Return CONJUGATE_SYMMETRY or POINT_SYMMETRY if the fractal 
+           computed with given values has that symmetry, else None."""
+        return None
+
+    def _toRgbImage(self, fractal, colors, color_offset, normalization):
         """
         Convert the generated fractal into an RGB image array.
 
         :param colors: Number of colors permitted in image
         :param color_offset: Default offset for generating color hues
+        :param normalization: Normalization of the frame the fractal is part
+                              of
         :return: ndarry of shape (n, m, 3)
         """
-        fractal_color_adjusted = utils.adjustRange(fractal)
+        fractal, amax = self._colorValues(fractal, normalization)
+        fractal_color_adjusted = utils.adjustRange(fractal, amax=amax)
         rgb_image = np.array([
             fractal_color_adjusted, 
             np.zeros(fractal.shape), 
@@ -80,39 +424,125 @@ class Fractal(QObject):
 
         return rgb_image.T
 
-    def _complexPlane(self, n, m, xmin, ymin, xmax, ymax):
-        """Return matrix representing the complex plane."""
-        # Create two matrices of size n x m,
-        # [0, 1 ...   and [0, 0 ...
-        #  0, 1 ...]       1, 1 ...]
-        ix, iy = np.mgrid[0:n, 0:m]
+    def _colorValues(self, fractal, normalization):
+        """
+        Return values of a computed fractal to colour by.
+
+        :return: Tuple (values, their maximum over the frame); values are 
+                 histogram equalized, with maximum 1, if equalizeHistogram 
+                 is set
+        """
+        if self.equalizeHistogram:
+            return normalization.equalize(fractal), 1.0
+        return fractal.value(), normalization.maximum["value"]
 
+    def _complexPlane(self, n, m, xmin, ymin, xmax, ymax, origin=None):
+        """Return matrix representing the complex plane; a DDComplex
+           matrix of offsets from origin, if given, as in double-double 
+           mode."""
         # Create range of values in the x- and y-axis
-        real_part = np.linspace(xmin, xmax, n)[ix]
-        imag_part = np.linspace(ymin, ymax, m)[iy] * complex(0, 1)
+        real_part = np.linspace(xmin, xmax, n)
+        imag_part = np.linspace(ymin, ymax, m) * complex(0, 1)
 
-        complex_plane = real_part + imag_part
+        # Broadcast column of real values against row of imaginary values,
+        # giving matrix of size n x m.
+        complex_plane = real_part[:, np.newaxis] + imag_part[np.newaxis, :]
+        if origin is not None:
+            # Offsets from the view origin are small enough to be exact.
+            complex_plane = origin + complex_plane
         return complex_plane
 
     def resetZoom(self):
         """Set zoom to original default values."""
+        self.doubleDouble = False
+        self.viewOrigin = DDComplex.fromComplex(0)
         self.xmin, self.ymin, self.xmax, self.ymax = self.defaultZoom()
 
     def zoom(self, factor):
-        """Zoom into fractal by given factor."""
-        image_width = self.xmax - self.xmin
-        image_height = self.ymax - self.ymin
+        """Zoom into fractal by given factor, switching to double-double 
+           precision as the view becomes too narrow for float64."""
+        self.xmin, self.ymin, self.xmax, self.ymax = self.zoomedView(factor)
+        self._updatePrecision()
+
+        self.renderRequested.emit()
+
+    def zoomedView(self, factor):
+        """
+        Return view, (xmin, ymin, xmax, ymax), after zooming into the
+        fractal by given factor.
+
+        With usePyramid set, views are snapped onto the pyramid's lattice,
+        so that they are composed from its tiles: they zoom by whole powers
+        of two, at least one for any nonzero factor, about the lattice point
+        nearest their centre.
+        """
+        xmin, ymin, xmax, ymax = self.view()
+        image_width = xmax - xmin
+        image_height = ymax - ymin
         zoom_x = factor * image_width
         zoom_y = factor * image_height
-        self.xmin += zoom_x / 2
-        self.xmax -= zoom_x / 2
-        self.ymin += zoom_y / 2
-        self.ymax -= zoom_y / 2
+        xmin += zoom_x / 2
+        xmax -= zoom_x / 2
+        ymin += zoom_y / 2
+        ymax -= zoom_y / 2
+        if not self.usePyramid or self.doubleDouble:
+            return (xmin, ymin, xmax, ymax)
+
+        pyramid = self._tilePyramid((self.xres, self.yres))
+        current = pyramid.nearestLevel(self.xres, self.yres, *self.view())
+        level = pyramid.nearestLevel(
+            self.xres, self.yres, xmin, ymin, xmax, ymax)
+        if factor > 0:
+            level = max(level, current + 1)
+        elif factor < 0:
+            level = min(level, current - 1)
+        return pyramid.snapView(
+            self.xres, self.yres, xmin, ymin, xmax, ymax, level)
+
+    def view(self):
+        """Return region of the complex plane being viewed, as tuple 
+           (xmin, ymin, xmax, ymax) relative to viewOrigin."""
+        return (self.xmin, self.ymin, self.xmax, self.ymax)
+
+    def setView(self, xmin, ymin, xmax, ymax):
+        """Set the region of the complex plane being viewed."""
+        self.doubleDouble = False
+        self.viewOrigin = DDComplex.fromComplex(0)
+        self.xmin, self.ymin, self.xmax, self.ymax = xmin, ymin, xmax, ymax
+        self._updatePrecision()
 
         self.renderRequested.emit()
 
+    def _updatePrecision(self):
+        """
+        Switch to double-double precision once the view is narrower than
+        DOUBLE_DOUBLE_WIDTH, or back to float64 once it is wider.
+
+        In double-double mode the view is held relative to viewOrigin, a
+        DDComplex, so that its bounds stay exact in float64.
+        """
+        width = min(self.xmax - self.xmin, self.ymax - self.ymin)
+        deep = self.DOUBLE_DOUBLE and width < Fractal.DOUBLE_DOUBLE_WIDTH
+        if deep == self.doubleDouble:
+            return
+
+        if deep:
+            # Rebase the view onto its centre.
+            shift = complex((self.xmin + self.xmax) / 2,
+                            (self.ymin + self.ymax) / 2)
+            self.viewOrigin = self.viewOrigin + shift
+        else:
+            shift = -complex(np.asarray(self.viewOrigin))
+            self.viewOrigin = DDComplex.fromComplex(0)
+
+        self.xmin -= shift.real
+        self.xmax -= shift.real
+        self.ymin -= shift.imag
+        self.ymax -= shift.imag
+        self.doubleDouble = deep
+
     def _computeFractal(self, complex_plane, **kwargs):
-        """Return matrix representing computed fractal."""
+        """Return FractalResult representing computed fractal."""
         raise NotImplementedError
 
     def _createControls(self):
@@ -0,0 +1,375 @@
+import numpy as np
+
+
+class FractalResult(object):
+    """
+    Compact raw fractal, shared by every fractal and colorizer.
+
+    Each component is an optional array of the result's shape, (..., n, m),
+    whose last two axes are the pixel axes:
+
+    - counts: uint16 (or uint32) escape counts; zero for interior pixels
+    - fractions: float32 smooth fractions added to counts
+    - roots: uint8 (or uint16, uint32) indices into rootValues, a complex
+      table of the values pixels settled on, e.g. the roots Newton's method
+      converged to; index 0 holds NaN, for pixels with no tabled value
+    - points: complex64 values of pixels which settled on no root, whose
+      root index is 0; NaN elsewhere
+
+    Results index, assign and concatenate along their pixel axes like
+    ndarrays, so that tiles may be cropped, mirrored, cached and assembled;
+    assigning merges root tables, and cropping, assigning and averaging
+    drop roots no pixel indexes any more.
+    """
+
+    __slots__ = ("counts", "fractions", "roots", "rootValues", "scale",
+                 "points")
+
+    # Static constants.
+    # Relative spacing of the grid roots are rounded onto.
+    ROOT_TOLERANCE = 1e-6
+
+    _COMPONENTS = ("counts", "fractions", "roots", "points")
+
+    def __init__(self, counts=None, fractions=None, roots=None,
+                 root_values=None, scale=1.0, points=None):
+        """
+        :param scale: Value of counts + fractions mapped to 1 by value()
+        """
+        self.counts = counts
+        self.fractions = fractions
+        self.roots = roots
+        self.rootValues = root_values
+        self.scale = scale
+        self.points = points
+
+    @staticmethod
+    def countType(maximum):
+        """Return smallest unsigned integer type holding counts up to
+           maximum."""
+        return np.uint16 if maximum <= np.iinfo(np.uint16).max else np.uint32
+
+    @staticmethod
+    def fromRoots(z, counts, tolerance=ROOT_TOLERANCE, converged=None):
+        """
+        Return result indexing the values which pixels settled on.
+
+        Values are rounded onto a grid whose spacing is tolerance relative
+        to their magnitude, or absolute below a magnitude of 1, and values
+        rounding to the same point share an entry of the root table. Values
+        of pixels which did not converge are kept as points instead, as
+        they seldom share a root.
+
+        :param z: Complex array of values pixels settled on; pixels whose
+                  value is not finite take root index 0, whose value is NaN
+        :param counts: Counts of the result
+        :param tolerance: Relative spacing of the grid values are rounded
+                          onto
+        :param converged: Boolean array of pixels whose value is a root, or
+                          None if every value is
+        """
+        finite = np.isfinite(z)
+        tabled = finite if converged is None else finite & converged
+        values = z[tabled]
+
+        # Spacing is a power of two, so that it changes only between bands
+        # of magnitude and equal values round alike.
+        magnitude = np.maximum(np.absolute(values), 1)
+        spacing = tolerance * np.exp2(np.ceil(np.log2(magnitude)))
+        quantized = (np.round(values.real / spacing) * spacing
+                     + np.round(values.imag / spacing) * spacing * 1j)
+        root_values, inverse = np.unique(quantized, return_inverse=True)
+        root_values = np.concatenate(([complex(np.nan, np.nan)], root_values))
+
+        roots = np.zeros(np.shape(z), dtype=_rootType(root_values.size))
+        roots[tabled] = inverse.reshape(-1) + 1
+        points = None
+        if np.any(finite & ~tabled):
+            points = np.where(finite & ~tabled, z, np.nan)
+            points = points.astype(np.complex64)
+        return FractalResult(counts=counts, roots=roots,
+                             root_values=root_values, points=points)
+
+    @staticmethod
+    def concatenate(results, axis=-1):
+        """Return results joined along a pixel axis."""
+        joined = FractalResult(scale=results[0].scale)
+        mappings = [joined._mergeRoots(result) for result in results]
+        for name in FractalResult._COMPONENTS:
+            components = [getattr(result, name) for result in results]
+            present = [c for c in components if c is not None]
+            if not present:
+                continue
+
+            # Results lacking a component, e.g. fractions, take zeros.
+            components = [
+                _missing(name, result.shape, present[0].dtype)
+                if component is None else component
+                for result, component in zip(results, components)]
+            if name == "roots":
+                components = [
+                    mapping[component].astype(
+                        _rootType(joined.rootValues.size))
+                    for mapping, component in zip(mappings, components)]
+            setattr(joined, name, np.concatenate(components, axis=axis))
+        return joined
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in FractalResult.__slots__)
+
+    def __setstate__(self, state):
+        # Results pickled before points were kept have none.
+        self.points = None
+        for name, value in zip(FractalResult.__slots__, state):
+            setattr(self, name, value)
+
+    @property
+    def shape(self):
+        return self._first().shape
+
+    @property
+    def nbytes(self):
+        nbytes = sum(
+            component.nbytes for _, component in self._components())
+        if self.rootValues is not None:
+            nbytes += self.rootValues.nbytes
+        return nbytes
+
+    def value(self):
+        """Return (counts + fractions) / scale as a float array."""
+        value = np.zeros(self.shape, dtype=float)
+        if self.counts is not None:
+            value += self.counts
+        if self.fractions is not None:
+            value += self.fractions
+        return value / self.scale
+
+    def rootValue(self):
+        """Return complex array of the value each pixel settled on."""
+        values = self.rootValues[self.roots]
+        if self.points is not None:
+            values = np.where(self.roots == 0, self.points, values)
+        return values
+
+    def components(self):
+        """Return list of float arrays whose differences between
+           neighbouring pixels mark edges."""
+        components = []
+        if self.counts is not None or self.fractions is not None:
+            components.append(self.value())
+        if self.roots is not None:
+            # Pixels without a finite value differ from every other.
+            root_value = np.nan_to_num(self.rootValue())
+            components += [root_value.real, root_value.imag]
+        return components
+
+    def toRecords(self):
+        """
+        Return structured array with a field per component, roots being
+        given by value and whether it was tabled, for storing outside of
+        Python.
+
+        Counts and fractions are both stored if either is, so that tiles
+        only some of which gained fractions from antialiasing share a dtype.
+        """
+        fields = []
+        if self.counts is not None or self.fractions is not None:
+            counts = self.counts
+            count_type = np.uint16 if counts is None else counts.dtype
+            fields += [("count", count_type), ("fraction", np.float32)]
+        if self.roots is not None:
+            fields += [("root", np.complex64), ("tabled", np.bool_)]
+
+        records = np.zeros(self.shape, dtype=fields)
+        if self.counts is not None:
+            records["count"] = self.counts
+        if self.fractions is not None:
+            records["fraction"] = self.fractions
+        if self.roots is not None:
+            records["root"] = self.rootValue()
+            records["tabled"] = self.roots > 0
+        return records
+
+    @staticmethod
+    def fromRecords(records, scale=1.0):
+        """
+        Return result stored as records, as from toRecords; roots are
+        tabled again from their values.
+
+        :param scale: Scale of the stored result, which records omit
+        """
+        names = records.dtype.names
+        result = FractalResult()
+        if "root" in names:
+            result = FractalResult.fromRoots(
+                records["root"].astype(complex), None,
+                converged=records["tabled"])
+        if "count" in names:
+            result.counts = np.array(records["count"])
+            result.fractions = np.array(records["fraction"])
+        result.scale = scale
+        return result
+
+    def empty(self, shape, allocate=np.empty):
+        """Return uninitialised result with this result's components and
+           leading axes, over pixel axes of given shape."""
+        result = FractalResult(
+            root_values=self.rootValues, scale=self.scale)
+        for name, component in self._components():
+            setattr(result, name, allocate(
+                component.shape[:-2] + tuple(shape), dtype=component.dtype))
+        return result
+
+    def zeros(self, shape):
+        """Return result as from empty(), of zeros; pixels find no root."""
+        result = self.empty(shape, np.zeros)
+        if result.points is not None:
+            result.points[...] = np.nan
+        return result
+
+    def reshape(self, *shape):
+        return self._map(lambda component: component.reshape(*shape))
+
+    def mean(self):
+        """
+        Return result averaging samples along the last axis.
+
+        Counts and fractions are averaged into counts plus fractions, and
+        roots take their most frequent value.
+        """
+        result = FractalResult(root_values=self.rootValues, scale=self.scale)
+        if self.counts is not None or self.fractions is not None:
+            total = self.value().mean(axis=-1) * self.scale
+            if self.counts is not None:
+                maximum = np.iinfo(self.counts.dtype).max
+                counts = np.floor(np.clip(total, 0, maximum))
+                result.counts = counts.astype(self.counts.dtype)
+                total = total - counts
+            result.fractions = total.astype(np.float32)
+
+        if self.roots is not None:
+            # Count the samples sharing each sample's root, then take the
+            # most frequent; ties go to the earliest sample, whatever the
+            # order of the root table.
+            # order of the root table. Each sample with a point is a root of
+            # its own.
+            roots = self.roots.reshape(-1, self.roots.shape[-1])
+            keys = roots.astype(np.int64)
+            if self.points is not None:
+                points = self.points.reshape(roots.shape)
+                own = (roots == 0) & np.isfinite(points)
+                samples = np.arange(roots.shape[-1])
+                keys = np.where(own, -1 - samples, keys)
+            same = keys[:, :, np.newaxis] == keys[:, np.newaxis, :]
+            frequency = same.sum(axis=-1)
+            rows = np.arange(roots.shape[0])
+            chosen = frequency.argmax(axis=-1)
+            shape = self.roots.shape[:-1]
+            result.roots = roots[rows, chosen].reshape(shape)
+            if self.points is not None:
+                result.points = points[rows, chosen].reshape(shape)
+            result._dropUnusedRoots()
+        return result
+
+    def __getitem__(self, index):
+        result = self._map(lambda component: component[index])
+        result._dropUnusedRoots()
+        return result
+
+    def __setitem__(self, index, other):
+        mapping = self._mergeRoots(other)
+        for name in FractalResult._COMPONENTS:
+            component = getattr(other, name)
+            if component is None:
+                # Missing counts or fractions are zero, missing points NaN.
+                if getattr(self, name) is not None:
+                    getattr(self, name)[index] = _missing(name, (), np.uint8)
+                continue
+            if name == "roots":
+                component = mapping[component]
+            if getattr(self, name) is None:
+                # Gain the component, e.g. fractions of averaged counts.
+                setattr(self, name,
+                        _missing(name, self.shape, component.dtype))
+            getattr(self, name)[index] = component
+        self._dropUnusedRoots()
+
+    def _dropUnusedRoots(self):
+        """Drop entries of the root table which no pixel indexes."""
+        if self.roots is None or self.rootValues is None:
+            return
+        used = np.bincount(
+            self.roots.reshape(-1), minlength=self.rootValues.size) > 0
+        used[0] = True
+        if used.all():
+            return
+        mapping = np.cumsum(used) - 1
+        self.rootValues = self.rootValues[used]
+        self.roots = mapping[self.roots].astype(
+            _rootType(self.rootValues.size))
+
+    def _mergeRoots(self, other):
+        """
+        Append roots of other missing from this result's table.
+
+        :return: Array mapping other's root indices onto this result's
+        """
+        if other.rootValues is None:
+            return None
+        if self.rootValues is None or self.rootValues is other.rootValues:
+            self.rootValues = other.rootValues
+            return np.arange(other.rootValues.size)
+
+        # Index 0 of each table is the NaN of pixels without a value; the
+        # rest of a table is unique.
+        order = np.argsort(self.rootValues[1:])
+        known = self.rootValues[1:][order]
+        values = other.rootValues[1:]
+        position = np.searchsorted(known, values)
+        found = np.zeros(values.shape, dtype=bool)
+        if known.size:
+            found = known[np.minimum(position, known.size - 1)] == values
+
+        mapping = np.zeros(other.rootValues.size, dtype=np.int64)
+        mapping[1:][found] = order[position[found]] + 1
+        added, index = np.unique(values[~found], return_inverse=True)
+        mapping[1:][~found] = self.rootValues.size + index.reshape(-1)
+
+        if added.size:
+            self.rootValues = np.concatenate((self.rootValues, added))
+            if self.roots is not None:
+                self.roots = self.roots.astype(
+                    _rootType(self.rootValues.size))
+        return mapping
+
+    def _components(self):
+        """Return list of (name, component) of present components."""
+        return [
+            (name, getattr(self, name)) for name in FractalResult._COMPONENTS
+            if getattr(self, name) is not None]
+
+    def _first(self):
+        return self._components()[0][1]
+
+    def _map(self, function):
+        """Return result with function applied to each component."""
+        result = FractalResult(root_values=self.rootValues, scale=self.scale)
+        for name, component in self._components():
+            setattr(result, name, function(component))
+        return result
+
+
+def _missing(name, shape, dtype):
+    """Return component for pixels of a result lacking it: NaN points, or
+       zeros."""
+    if name == "points":
+        return np.full(shape, np.nan, dtype=np.complex64)
+    return np.zeros(shape, dtype=dtype)
+
+
+def _rootType(size):
+    """Return smallest unsigned integer type indexing a table of roots."""
+    for root_type in (np.uint8, np.uint16):
+        if size <= np.iinfo(root_type).max + 1:
+            return root_type
+    return np.uint32
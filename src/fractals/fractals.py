@@ -1,3 +1,4 @@
+from buddhabrot import Buddhabrot
 from fractal import Fractal
 from julia import Julia
 from mandelbrot import Mandelbrot
@@ -9,6 +10,7 @@ MANDELBROT = Mandelbrot("Mandelbrot Set")
 NEWTON =     Newton("Newton Fractal")
 JULIA =      Julia("Julia Set")
 PHEONIX =    Pheonix("Pheonix Fractal")
+BUDDHABROT = Buddhabrot("Buddhabrot")
 
 
 def getFractal(fractal_id):
@@ -1,21 +1,54 @@
 import matplotlib as mpl
 import numpy as np
-import numpy.matlib
 
+from cache import LruCache
+from controls import Option
+from controls import OptionSelect
 from controls import ValueControl
+from doubledouble import DDComplex
 from fractal import Fractal
+from fractalresult import FractalResult
+
+
+# Methods of computing the Julia set.
+ESCAPE_TIME = Option("Escape Time")
+INVERSE_ITERATION = Option("Inverse Iteration (Boundary Only)")
+METHODS = [ESCAPE_TIME, INVERSE_ITERATION]
 
 
 class Julia(Fractal):
 
-    def _toRgbImage(self, fractal, colors, color_offset):
+    # Static constants.
+    AA_THRESHOLD = 0.1
+    DOUBLE_DOUBLE = True
+    FRAME_SCALED = False
+
+    # Most cells across the grid inverse iteration samples the whole Julia
+    # set on, and times each cell may be visited before the points landing
+    # there stop being iterated further.
+    MIIM_MAX_GRID = 2048
+    MIIM_VISITS = 16
+
+    # Size beyond which least recently used boundary points are evicted.
+    MIIM_BYTES = 64 << 20
+
+    def __init__(self, name):
+        super(Julia, self).__init__(name)
+
+        # Boundary points found by inverse iteration, for each c and grid.
+        self._boundaries = LruCache(Julia.MIIM_BYTES)
+
+    def _toRgbImage(self, fractal, colors, color_offset, normalization):
         """
         Convert the generated fractal into an RGB image array.
 
         :param colors: Number of colors permitted in image
         :param color_offset: Default offset for generating color hues
+        :param normalization: Normalization of the frame the fractal is part
+                              of
         :return: ndarry of shape (n, m, 3)
         """
+        fractal, _ = self._colorValues(fractal, normalization)
         colour_count = 5
         hsv_img = np.array(
             [
@@ -33,12 +66,18 @@ class Julia(Fractal):
         rgb_img = (mpl.colors.hsv_to_rgb(hsv_img) * 255).astype(dtype=np.uint8)
         return rgb_img
 
-    def _computeFractal(self, complex_plane, itermax, cr=1.0, ci=0.0):
+    def _computeFractal(self, complex_plane, itermax, cr=1.0, ci=0.0, 
+                        m=ESCAPE_TIME):
         c = complex(cr, ci)
         z = complex_plane
 
-        # Create matrix to represent this fractal.
-        fractal = np.matlib.zeros(z.shape, dtype=float)
+        if m is INVERSE_ITERATION:
+            return self._inverseIteration(complex_plane, itermax, c)
+        if isinstance(z, DDComplex):
+            return self._computeDoubleDouble(z, itermax, c)
+
+        # Create array to represent this fractal.
+        fractal = np.zeros(z.shape, dtype=float)
 
         for i in xrange(itermax):
             z = np.square(z) + c
@@ -51,17 +90,135 @@ class Julia(Fractal):
                 where=np.invert(np.isnan(z))
             )
 
-        # Represent fractal as floats ranging between 0 and 1.
-        fractal /= itermax
-        fractal[fractal > 1] = 1
-        fractal[fractal < 0] = 0
+        # Each term lies within [0, 1], so values range between 0 and 1.
+        return FractalResult(
+            fractions=fractal.astype(np.float32), scale=itermax)
+
+    def _computeDoubleDouble(self, complex_plane, itermax, c):
+        """As _computeFractal, for a DDComplex plane."""
+        shape = complex_plane.shape
+        z = complex_plane.reshape(-1)
+        fractal = np.zeros(z.size)
+
+        # Iterate only points whose exp(-|z|) has yet to vanish.
+        active = np.arange(z.size)
+        for i in xrange(itermax):
+            z = z.square() + c
+
+            magnitude = z.absolute()
+            fractal[active] += np.exp(-magnitude)
+
+            remaining = magnitude < 1e3
+            active, z = active[remaining], z[remaining]
+            if not active.size:
+                break
+
+        return FractalResult(
+            fractions=fractal.reshape(shape).astype(np.float32),
+            scale=itermax)
+
+    def _inverseIteration(self, complex_plane, itermax, c):
+        """
+        Return the boundary of the Julia set, using the modified inverse
+        iteration method (MIIM).
+
+        Points of the boundary, found by _boundaryPoints on a grid whose
+        cells are no larger than the view's pixels, are marked on the
+        pixels nearest them. Views zoomed beyond MIIM_MAX_GRID cells across
+        the set show its boundary only as finely as that grid samples it.
+
+        :return: Result whose counts are 1 on the boundary, 0 elsewhere
+        """
+        plane = np.asarray(complex_plane)
+        n, m = plane.shape
+        xmin, ymin = plane[0, 0].real, plane[0, 0].imag
+        dx = (plane[-1, 0].real - xmin) / max(n - 1, 1)
+        dy = (plane[0, -1].imag - ymin) / max(m - 1, 1)
+        # A single row or column takes the other axis' spacing.
+        dx, dy = dx or dy or 1.0, dy or dx or 1.0
+
+        # Cells no larger than pixels, so that each point marks its cell.
+        radius = 0.5 + np.sqrt(0.25 + abs(c))
+        cells = 2 ** int(np.ceil(np.log2(2 * radius / min(abs(dx), abs(dy)))))
+        points = self._boundaryPoints(
+            c, int(np.clip(cells, 1, Julia.MIIM_MAX_GRID)))
+
+        counts = np.zeros((n, m), dtype=FractalResult.countType(1))
+        ix = np.floor((points.real - xmin) / dx + 0.5).astype(np.int64)
+        iy = np.floor((points.imag - ymin) / dy + 0.5).astype(np.int64)
+        inside = (ix >= 0) & (ix < n) & (iy >= 0) & (iy < m)
+        counts[ix[inside], iy[inside]] = 1
+        return FractalResult(counts=counts)
+
+    def _boundaryPoints(self, c, cells):
+        """
+        Return flat array of points on the boundary of the Julia set, one
+        in each cell of a grid of cells by cells covering the set, which
+        lies within |z| <= 0.5 + sqrt(0.25 + |c|), that the boundary
+        crosses. Points are cached for each c and grid.
+
+        Starting from the repelling fixed point, which lies on the boundary,
+        preimages z -> +-sqrt(z - c) are taken generation by generation. A
+        preimage landing in a cell already visited MIIM_VISITS times is
+        dropped, so the work done scales with the length of the boundary
+        rather than the area of the plane.
+        """
+        points = self._boundaries.get((c, cells))
+        if points is not None:
+            return points
+
+        radius = 0.5 + np.sqrt(0.25 + abs(c))
+        cell_size = 2 * radius / cells
+        visits = np.zeros(cells * cells, dtype=np.uint8)
+        owner = np.zeros(cells * cells, dtype=np.int32)
+
+        # Of the two fixed points, the repelling one has |2z| > 1.
+        root = np.sqrt(complex(1 - 4 * c))
+        z = np.array([max((1 + root) / 2, (1 - root) / 2, key=abs)])
+
+        generations = []
+        while z.size:
+            z = np.sqrt(z - c)
+            z = np.concatenate((z, -z))
+
+            gx = np.clip(((z.real + radius) / cell_size).astype(np.int64),
+                0, cells - 1)
+            gy = np.clip(((z.imag + radius) / cell_size).astype(np.int64),
+                0, cells - 1)
+
+            # Keep one point per cell each generation, the last written to
+            # its owner, in cells not yet full.
+            cell = gx * cells + gy
+            index = np.arange(cell.size, dtype=np.int32)
+            owner[cell] = index
+            chosen = index[owner[cell] == index]
+            cell = cell[chosen]
+            keep = visits[cell] < self.MIIM_VISITS
+            found = visits[cell[keep]] == 0
+            visits[cell[keep]] += 1
+            z = z[chosen[keep]]
+            generations.append(z[found].astype(np.complex64))
+
+        points = np.concatenate(generations)
+        self._boundaries.put((c, cells), points)
+        return points
+
+    def _isPointwise(self, m=ESCAPE_TIME, **kwargs):
+        """Return whether each pixel is computed independently of others, 
+           so that any subset of the plane may be computed on its own."""
+        return m is not INVERSE_ITERATION
 
-        # Returns the image matrix
-        return fractal
+    def _symmetry(self, **kwargs):
+        """Return CONJUGATE_SYMMETRY or POINT_SYMMETRY if the fractal 
+           computed with given values has that symmetry, else None."""
+        # z and -z share the same orbit after their first iteration.
+        return Fractal.POINT_SYMMETRY
 
     def _createControls(self):
         """Create UI for editing fractal generation parameters."""
         c_control = ValueControl("cr", vmin=-2, vmax=3, default=2, precision=2)
         i_control = ValueControl("ci", vmin=-2, vmax=3, default=2, precision=2)
+        m_control = OptionSelect("m", ESCAPE_TIME, METHODS)
         self.controls.addControl("Real Value", c_control)
-        self.controls.addControl("Real Value", i_control)
\ No newline at end of file
+        self.controls.addControl("Real Value", i_control)
+        self.controls.addControl("Method", m_control)
\ No newline at end of file
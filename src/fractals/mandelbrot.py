@@ -1,54 +1,103 @@
 import matplotlib as mpl
 import numpy as np
-import numpy.matlib
 
 from controls import ValueControl
+from doubledouble import DDComplex
 from fractal import Fractal
+from fractalresult import FractalResult
+import utils
 
 
 class Mandelbrot(Fractal):
 
+    # Static constants.
+    AA_THRESHOLD = 0.1
+    DOUBLE_DOUBLE = True
+    FRAME_SCALED = False
+
     def _computeFractal(self, complex_plane, itermax, p=2):
         c = complex_plane
-        z = np.copy(c)
+        if isinstance(c, DDComplex) and p != int(p):
+            # Other powers have no double-double form; round to complex128.
+            c = np.asarray(c)
+
+        if isinstance(c, DDComplex):
+            absolute = DDComplex.absolute
+            power = lambda z, magnitude: z.square() if p == 2 else z ** int(p)
+        else:
+            absolute = np.absolute
+            power = utils.powerFunction(p)
+
+        # Iterate over flat arrays, so that finished orbits can be dropped.
+        shape = c.shape
+        c = c.reshape(-1)
+        z = c.copy()
+        active = np.arange(c.size)
+        bailout = self._bailout(p, np.max(absolute(c)) if c.size else 0.0)
 
-        # Create matrix to represent this fractal and escaped values.
-        fractal = np.matlib.zeros(c.shape, dtype=float)
-        escaped = np.matlib.zeros(c.shape, dtype=bool)
+        # Create arrays of escape counts, smooth fractions and escaped values.
+        counts = np.zeros(c.size, dtype=FractalResult.countType(itermax))
+        fractions = np.zeros(c.size, dtype=np.float32)
+        escaped = np.zeros(c.size, dtype=bool)
 
+        magnitude = absolute(z)
         for i in xrange(itermax):
             # Mandelbrot function is: f(z) = z^p + c; p is const.
-            if p == 2.0:
-                z = np.square(z)  # Runs much faster than np.power(z, 2).
-            else:
-                z = np.power(z, p)
-            z += c
-
-            # Smooth borders in fractal.
-            temp_escaped = (abs(z) > 2.0)
-            np.copyto(
-                fractal,
-                (i + 1 - np.log(np.log(np.absolute(z))) / np.log(2)),
-                casting='no',
-                where=np.invert(escaped) & temp_escaped
-            )
+            z = power(z, magnitude) + c
+
+            # Smooth borders in fractal; |z| is reused by the next power.
+            magnitude = absolute(z)
+            temp_escaped = (magnitude > 2.0)
+            crossed = np.invert(escaped) & temp_escaped
+            counts[active[crossed]] = i + 1
+            # Keep counts + fractions within [0, itermax].
+            fractions[active[crossed]] = np.clip(
+                -np.log(np.log(magnitude[crossed])) / np.log(2),
+                -(i + 1), itermax - (i + 1))
             escaped = temp_escaped
 
-        # Represent fractal as floats ranging between 0 and 1.
-        fractal /= itermax
-        fractal[fractal > 1] = 1
-        fractal[fractal < 0] = 0
+            # Orbits beyond the bailout, or overflowed, never cross |z| = 2
+            # again.
+            remaining = (magnitude <= bailout)
+            if not remaining.all():
+                active, z, c = active[remaining], z[remaining], c[remaining]
+                magnitude, escaped = magnitude[remaining], escaped[remaining]
+                if not active.size:
+                    break
 
-        return fractal
+        # Values range between 0 and 1; 0 for interior points.
+        return FractalResult(
+            counts=counts.reshape(shape), fractions=fractions.reshape(shape),
+            scale=itermax)
 
-    def _toRgbImage(self, fractal, colors, color_offset):
+    def _bailout(self, p, c_max):
+        """
+        Return radius beyond which orbits grow without bound, for |c| no
+        larger than c_max; infinite for powers no greater than 1.
+
+        For p > 1, r^p - r is increasing, so once r^p - r >= c_max every
+        larger |z| maps to a yet larger |z^p + c|.
+        """
+        bailout = 2.0
+        while p > 1 and bailout ** p - bailout < c_max:
+            bailout *= 2
+            if bailout > 1e100:
+                break
+        if p <= 1 or bailout > 1e100:
+            return np.inf
+        return bailout
+
+    def _toRgbImage(self, fractal, colors, color_offset, normalization):
         """
         Convert the generated fractal into an RGB image array.
 
         :param colors: Number of colors permitted in image
         :param color_offset: Default offset for generating color hues
+        :param normalization: Normalization of the frame the fractal is part
+                              of
         :return: ndarry of shape (n, m, 3)
         """
+        fractal, _ = self._colorValues(fractal, normalization)
         colour_count = 5
         hsv_img = np.array(
             [
@@ -67,6 +116,12 @@ class Mandelbrot(Fractal):
         rgb_img = (mpl.colors.hsv_to_rgb(hsv_img) * 255).astype(dtype=np.uint8)
         return rgb_img
 
+    def _symmetry(self, **kwargs):
+        """Return CONJUGATE_SYMMETRY or POINT_SYMMETRY if the fractal 
+           computed with given values has that symmetry, else None."""
+        # For real p the orbit of conj(c) is the conjugate of that of c.
+        return Fractal.CONJUGATE_SYMMETRY
+
     def _createControls(self):
         """Create UI for editing fractal generation parameters."""
         p_control = ValueControl("p", vmin=-2, vmax=3, default=2, precision=2)
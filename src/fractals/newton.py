@@ -1,9 +1,9 @@
 import numpy as np
-import numpy.matlib
 
 from controls import ValueControl
 from controls import OptionSelect
 from fractal import Fractal
+from fractalresult import FractalResult
 import utils
 
 
@@ -15,6 +15,7 @@ class Function(object):
     _ID = 0
 
     def __init__(self, name, func, deriv):
+        self._id = Function._ID
         self.name = name
         self._f = func
         self._df = deriv
@@ -23,6 +24,10 @@ class Function(object):
         Function.FUNCTIONS.append(self)
         Function._ID += 1
 
+    def __reduce__(self):
+        # Pickle by reference, as lambdas cannot be pickled.
+        return (getFunction, (self._id,))
+
     def __call__(self, *args):
         return self._f(*args)
 
@@ -68,29 +73,43 @@ class Newton(Fractal):
     def _computeFractal(self, complex_plane, itermax, f=TRIG1, a=1.0, e=0.001):
         z = complex_plane
 
-        # Matrix of number of iterations required to reach solution.
-        root_iters = np.matlib.zeros(z.shape)
+        # Array of number of iterations required to reach solution.
+        root_iters = np.zeros(z.shape, dtype=FractalResult.countType(itermax))
 
+        step = np.zeros(z.shape, dtype=z.dtype)
         for i in xrange(itermax):
-            z = f.newtonsMethod(z, a)
+            z, previous = f.newtonsMethod(z, a), z
+            step = z - previous
 
             # Increment points where solutions have been found.
             roots = np.where(abs(f(z)) < e)
             root_iters[roots] += 1
 
-        return [z.real, z.imag, root_iters]
+        # Pixels are coloured by wherever they settled, root or not; only
+        # those whose last step no longer moved them share table entries.
+        with np.errstate(invalid="ignore"):
+            converged = (np.absolute(step) <= FractalResult.ROOT_TOLERANCE
+                         * np.maximum(np.absolute(z), 1))
+        return FractalResult.fromRoots(z, root_iters, converged=converged)
 
-    def _toRgbImage(self, fractal, colors, color_offset):
+    def _toRgbImage(self, fractal, colors, color_offset, normalization):
         """
         Convert the generated fractal into an RGB image array.
 
         :param colors: Number of colors permitted in image
         :param color_offset: Default offset for generating color hues
+        :param normalization: Normalization of the frame the fractal is part
+                              of
         :return: ndarry of shape (n, m, 3)
         """
-        soln_real = utils.adjustRange(fractal[0], 0, 127)
-        soln_imag = utils.adjustRange(fractal[1], 0, 127)
-        iters = utils.adjustRange(fractal[2], 0, 128)
+        # Pixels without a finite value take solution 0.
+        soln = np.nan_to_num(fractal.rootValue())
+        soln_real = utils.adjustRange(
+            soln.real, 0, 127, normalization.maximum["real"])
+        soln_imag = utils.adjustRange(
+            soln.imag, 0, 127, normalization.maximum["imag"])
+        iters, iters_max = self._colorValues(fractal, normalization)
+        iters = utils.adjustRange(iters, 0, 128, iters_max)
 
         rgb_image = np.array([
                 soln_real + iters,
@@ -1,18 +1,26 @@
 import numpy as np
-import numpy.matlib
 
 from controls import ValueControl
+from doubledouble import DDComplex
 from fractal import Fractal
+from fractalresult import FractalResult
 
 
 class Pheonix(Fractal):
 
+    # Static constants.
+    DOUBLE_DOUBLE = True
+    TRANSPOSED = True
+
     def _computeFractal(self, complex_plane, itermax, p=2.0, c=1.0):
+        if isinstance(complex_plane, DDComplex):
+            return self._computeDoubleDouble(complex_plane, itermax, p, c)
+
         z1 = complex_plane
         z0 = np.zeros(complex_plane.shape)
 
-        # Create matrix to represent this fractal.
-        fractal = np.matlib.zeros(z1.shape, dtype=int)
+        # Create array of escape counts to represent this fractal.
+        fractal = np.zeros(z1.shape, dtype=FractalResult.countType(itermax))
 
         for i in xrange(itermax):
             temp = z1
@@ -25,4 +33,57 @@ class Pheonix(Fractal):
             escaped = (abs(z1) > 2.0)
             fractal[escaped] = i + 1
 
-        return fractal.T
+        return FractalResult(counts=fractal)
+
+    def _computeDoubleDouble(self, complex_plane, itermax, p, c):
+        """
+        As _computeFractal, for a DDComplex plane.
+
+        Escaped orbits no longer need the precision, and carry on in 
+        complex128 so as to overflow exactly as they do there.
+        """
+        shape = complex_plane.shape
+        z1 = complex_plane.reshape(-1)
+        z0 = DDComplex.fromComplex(np.zeros(z1.size))
+        fractal = np.zeros(z1.size, dtype=FractalResult.countType(itermax))
+
+        active = np.arange(z1.size)
+        escaped_index = np.zeros(0, dtype=int)
+        escaped_z1 = escaped_z0 = np.zeros(0, dtype=complex)
+        for i in xrange(itermax):
+            z1, z0 = z1.square() + c + p * z0, z1
+            escaped_z1, escaped_z0 = (
+                np.square(escaped_z1) + c + p * escaped_z0, escaped_z1)
+
+            # Update 'escaped' values in image.
+            fractal[escaped_index[abs(escaped_z1) > 2.0]] = i + 1
+            escaped = z1.absolute() > 2.0
+            fractal[active[escaped]] = i + 1
+
+            remaining = np.invert(escaped)
+            escaped_index = np.concatenate((escaped_index, active[escaped]))
+            escaped_z1 = np.concatenate((escaped_z1, np.asarray(z1[escaped])))
+            escaped_z0 = np.concatenate((escaped_z0, np.asarray(z0[escaped])))
+            active, z1, z0 = active[remaining], z1[remaining], z0[remaining]
+
+        return FractalResult(counts=fractal.reshape(shape))
+
+    def _toRgbImage(self, fractal, colors, color_offset, normalization):
+        """
+        Convert the generated fractal into an RGB image array.
+
+        :param colors: Number of colors permitted in image
+        :param color_offset: Default offset for generating color hues
+        :param normalization: Normalization of the frame the fractal is part
+                              of
+        :return: ndarry of shape (n, m, 3)
+        """
+        rgb_image = super(Pheonix, self)._toRgbImage(
+            fractal, colors, color_offset, normalization)
+        return rgb_image.swapaxes(0, 1)
+
+    def _symmetry(self, **kwargs):
+        """Return CONJUGATE_SYMMETRY or POINT_SYMMETRY if the fractal 
+           computed with given values has that symmetry, else None."""
+        # With real p and c, the orbit of conj(z) is the conjugate of z's.
+        return Fractal.CONJUGATE_SYMMETRY
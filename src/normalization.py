@@ -0,0 +1,144 @@
+import numpy as np
+
+
+class Normalization(object):
+    """
+    Parameters normalizing a raw fractal for colouring, merged from
+    summaries of its tiles.
+
+    Holds the minimum and maximum of each quantity colorizers scale, per
+    leading channel of the result, and a histogram of values for histogram
+    equalized colouring: bin 0 counts values of zero, e.g. interior pixels,
+    and bin k + 1 values within (k, k + 1] of counts + fractions.
+
+    Tiles summarized into one Normalization may each be colorized alike as
+    soon as they are done, with no pass over the whole frame; frames
+    summarized into one pin the colours of an animation. The histogram is
+    only needed, and only built if asked for, to colour with histogram
+    equalization.
+    """
+
+    def __init__(self):
+        # Dictionaries of arrays, of the shape of the leading channels, by
+        # quantity.
+        self.minimum = {}
+        self.maximum = {}
+        self.histogram = None
+
+    @staticmethod
+    def fromResult(result, histogram=True):
+        """
+        Return Normalization summarizing a FractalResult.
+
+        :param histogram: Whether to build the histogram of values, which
+                          only histogram equalization needs
+        """
+        normalization = Normalization()
+        for name, values in Normalization._quantities(result):
+            pixels = values.reshape(values.shape[:-2] + (-1,))
+            # Unlike nanmin and nanmax, fmin and fmax do not warn of pixels
+            # all NaN.
+            normalization.minimum[name] = np.fmin.reduce(pixels, axis=-1)
+            normalization.maximum[name] = np.fmax.reduce(pixels, axis=-1)
+        if not histogram:
+            return normalization
+
+        bins, _ = Normalization._bins(result)
+        bins = bins.reshape(-1, bins.shape[-2] * bins.shape[-1])
+        length = bins.max() + 1 if bins.size else 1
+
+        # Count bins of each channel at once, offset by channel.
+        offsets = np.arange(bins.shape[0])[:, np.newaxis] * length
+        histogram = np.bincount(
+            (bins + offsets).ravel(), minlength=bins.shape[0] * length)
+        normalization.histogram = histogram.reshape(
+            result.shape[:-2] + (length,))
+        return normalization
+
+    def update(self, result, histogram=True):
+        """Merge the summary of a tile or frame into this Normalization,
+           building its histogram if asked to, as for fromResult."""
+        return self.merge(Normalization.fromResult(result, histogram))
+
+    def merge(self, other):
+        """Merge another Normalization into this one, returning self."""
+        for name in other.maximum:
+            if name in self.maximum:
+                self.minimum[name] = np.fmin(
+                    self.minimum[name], other.minimum[name])
+                self.maximum[name] = np.fmax(
+                    self.maximum[name], other.maximum[name])
+            else:
+                self.minimum[name] = other.minimum[name]
+                self.maximum[name] = other.maximum[name]
+
+        if self.histogram is None:
+            self.histogram = other.histogram
+        elif other.histogram is not None:
+            length = max(self.histogram.shape[-1], other.histogram.shape[-1])
+            self.histogram = (
+                _padded(self.histogram, length)
+                + _padded(other.histogram, length))
+        return self
+
+    def equalize(self, result):
+        """
+        Return values of a result histogram equalized, ranging between 0 and
+        1: the fraction of nonzero summarized values up to each value,
+        interpolated within its bin, so that the lowest counts of integer
+        values take more than 0. Zero values remain 0. Needs the histogram,
+        see fromResult.
+        """
+        histogram = self.histogram.astype(float)
+        length = histogram.shape[-1]
+        bins, fractions = Normalization._bins(result)
+
+        # Values beyond those summarized, e.g. by a preview, take 1.
+        beyond = bins >= length
+        bins = np.minimum(bins, length - 1)
+        fractions[beyond] = 1
+
+        # Cumulative fractions of nonzero values up to the start of each bin.
+        nonzero = histogram[..., 1:].sum(axis=-1)[..., np.newaxis]
+        nonzero = np.maximum(nonzero, 1)
+        histogram[..., 0] = 0
+        ends = np.cumsum(histogram, axis=-1) / nonzero
+        starts = ends - histogram / nonzero
+
+        # Look up the bin of each pixel within the histogram of its channel.
+        channels = int(np.prod(bins.shape[:-2]))
+        starts = starts.reshape(channels, length)
+        ends = ends.reshape(channels, length)
+        pixels = bins.reshape(channels, -1)
+        channel = np.arange(channels)[:, np.newaxis]
+        start = starts[channel, pixels]
+        end = ends[channel, pixels]
+        equalized = start + fractions.reshape(channels, -1) * (end - start)
+        return equalized.reshape(bins.shape)
+
+    @staticmethod
+    def _quantities(result):
+        """Yield (name, values) of each quantity summarized, as colorizers
+           scale it."""
+        if result.counts is not None or result.fractions is not None:
+            yield "value", result.value()
+        if result.roots is not None:
+            # Pixels without a finite value take solution 0.
+            root_value = np.nan_to_num(result.rootValue())
+            yield "real", root_value.real
+            yield "imag", root_value.imag
+
+    @staticmethod
+    def _bins(result):
+        """Return (histogram bin, fraction through that bin) of each of a
+           result's values; integer values end their bin."""
+        values = np.maximum(result.value() * result.scale, 0)
+        bins = np.ceil(values).astype(np.int64)
+        return bins, values - np.maximum(bins - 1, 0)
+
+
+def _padded(histogram, length):
+    """Return histogram extended with empty bins to given length."""
+    padding = [(0, 0)] * (histogram.ndim - 1) + [
+        (0, length - histogram.shape[-1])]
+    return np.pad(histogram, padding, mode="constant")
@@ -0,0 +1,61 @@
+import collections
+import threading
+import time
+
+
+class Prefetcher(object):
+    """
+    Computes views the user is likely to request next, one after another in
+    a background thread, into each fractal's result cache.
+
+    Scheduling new views or cancelling drops queued views and stops the view
+    being computed at its next band, so that foreground renders never wait
+    on prefetching.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._jobs = collections.deque()
+        self._generation = 0
+
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def schedule(self, fractal, jobs):
+        """
+        Replace any queued views with given ones.
+
+        :param fractal: Fractal to compute
+        :param jobs: List of tuples (frame, args), most likely first, where
+                     frame is as from Fractal.frame() and args holds the
+                     value of every control
+        """
+        with self._condition:
+            self._generation += 1
+            self._jobs = collections.deque(
+                (self._generation, fractal, frame, args)
+                for frame, args in jobs)
+            self._condition.notify()
+
+    def cancel(self):
+        """Stop prefetching until views are next scheduled."""
+        with self._condition:
+            self._generation += 1
+            self._jobs.clear()
+
+    def _cancelled(self, generation):
+        return generation != self._generation
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._jobs:
+                    self._condition.wait()
+                generation, fractal, frame, args = self._jobs.popleft()
+
+            fractal.prefetchView(
+                frame, lambda: self._cancelled(generation), **args)
+
+            # Let any foreground render take the interpreter.
+            time.sleep(0)
@@ -23,12 +23,16 @@ global app
 app = QApplication(sys.argv)
 
 from fractals import fractals
+from prefetcher import Prefetcher
 
 
 class PyFractal(QWidget):
 
     # Static constants.
-    ZOOM_FACTOR = 0.1
+    # Zooming in halves the view and zooming out doubles it, so that views
+    # stay on the lattice of the fractal's pyramid of cached tiles.
+    ZOOM_FACTOR = 0.5
+    ZOOM_OUT_FACTOR = 1 - 1 / (1 - ZOOM_FACTOR)
     
     def __init__(self):
         super(PyFractal, self).__init__()
@@ -37,6 +41,9 @@ class PyFractal(QWidget):
         # Create thread which renders fractals.
         self._fractalThread = QThread()
 
+        # Compute likely next views while idle.
+        self._prefetcher = Prefetcher()
+
         # Size and center window.
         self.resize(500, 500)
         self.setGeometry(
@@ -75,12 +82,9 @@ class PyFractal(QWidget):
         self._fractalSelected(0)
         self._fractal.resetControls()
 
-        # Reset fractal zoom settings.
+        # Reset fractal zoom settings, updating fractal image.
         self._zoomReset()
 
-        # Update fractal image.
-        self._renderRequested()
-
 
     # {{{ - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     # }}} Constructor Helpers
@@ -110,6 +114,8 @@ class PyFractal(QWidget):
         self._fractalSelector = QComboBox()
         self._fractalControls = QStackedLayout()
         for fractal in fractals.getFractals():
+            # Cache views so that resetting the zoom is instant.
+            fractal.usePyramid = True
             self._fractalSelector.addItem(fractal.name)
             self._fractalControls.addWidget(fractal.controls)
 
@@ -122,20 +128,39 @@ class PyFractal(QWidget):
 
     def _zoomReset(self):
         self._fractal.resetZoom()
+        self._renderRequested()
 
     def _zoomIn(self):
         self._fractal.zoom(PyFractal.ZOOM_FACTOR)
 
     def _zoomOut(self):
-        self._fractal.zoom(-PyFractal.ZOOM_FACTOR)
+        self._fractal.zoom(PyFractal.ZOOM_OUT_FACTOR)
 
     def _renderRequested(self):
+        # Foreground renders take precedence over prefetching.
+        self._prefetcher.cancel()
+
         # Create thread for fractal rendering.
         self._fractalThread.quit()
         self._fractalThread.start()
 
     def _render(self, pixmap):
         self._fractalDisplay.setPixmap(pixmap)
+        self._prefetch()
+
+    def _prefetch(self):
+        """Prefetch views reached by the next zoom click or slider step."""
+        fractal = self._fractal
+        args = fractal.controls.args()
+        jobs = [
+            (fractal.frame(fractal.zoomedView(PyFractal.ZOOM_FACTOR)), args),
+            (fractal.frame(fractal.zoomedView(PyFractal.ZOOM_OUT_FACTOR)), args),
+        ]
+        jobs += [
+            (fractal.frame(), neighbour)
+            for neighbour in fractal.controls.neighbourArgs()
+        ]
+        self._prefetcher.schedule(fractal, jobs)
 
     def _fractalSelected(self, index):
         if self._fractal:
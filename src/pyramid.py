@@ -0,0 +1,319 @@
+import math
+
+import numpy as np
+
+from cache import LruCache
+
+
+class _Tile(object):
+    """Raw fractal of a tile, whose pixels are valid where the mask is set."""
+    __slots__ = ("result", "valid")
+
+    def __init__(self, result, valid):
+        self.result = result
+        self.valid = valid
+
+    @property
+    def nbytes(self):
+        return self.result.nbytes + self.valid.nbytes
+
+
+class Pyramid(object):
+    """
+    Cache of raw fractal tiles on a quadtree of power-of-two scales.
+
+    Tiles of level L sample the lattice origin + k * spacing / 2**L, so each
+    pixel of a tile is also a pixel of its four children. Tiles hold only
+    the pixels views have needed; missing pixels are decimated from cached
+    children, or mirrored, before being computed.
+    Views are composed from the coarsest level at least as fine as the view,
+    taking each pixel's nearest lattice point; this is exact only for views
+    whose pixels lie on that level's lattice, as isAligned() checks, and
+    snapView() moves views onto it.
+    """
+
+    # Static constants.
+    TILE_SIZE = 64
+
+    def __init__(self, origin, spacing, max_bytes=128 << 20):
+        """
+        :param origin: Tuple (x, y), lattice point shared by all levels
+        :param spacing: Tuple (dx, dy), distance between level 0 pixels
+        :param max_bytes: Size beyond which least recently used tiles are
+                          evicted
+        """
+        self.origin = origin
+        self.spacing = spacing
+        self._tiles = LruCache(max_bytes)
+
+    def compose(self, n, m, xmin, ymin, xmax, ymax, key, complex_plane,
+                compute, symmetry=None):
+        """
+        Return raw fractal over a view, computing only uncached tiles.
+
+        :param n, m, xmin, ymin, xmax, ymax: View, as for Fractal._complexPlane
+        :param key: Hashable identifying fractal parameters, e.g. iterations
+        :param complex_plane: Function taking (n, m, xmin, ymin, xmax, ymax)
+                              and returning the complex plane
+        :param compute: Function taking a complex plane of shape (n, m) and
+                        returning raw FractalResult of shape (..., n, m)
+        :param symmetry: Optional axes negated by the fractal's symmetry, 
+                         e.g. Fractal.CONJUGATE_SYMMETRY; missing tiles 
+                         mirroring other tiles are then copied rather than 
+                         computed
+        :return: FractalResult of shape (..., n, m)
+        """
+        level = self.level(n, m, xmin, ymin, xmax, ymax)
+        gx = self._latticeIndices(xmin, xmax, n, 0, level)
+        gy = self._latticeIndices(ymin, ymax, m, 1, level)
+        tiles = self.tiles(gx, gy)
+
+        # Gather tiles into a single region of the lattice.
+        size = Pyramid.TILE_SIZE
+        i0, j0 = tiles[0][0], tiles[0][1]
+        region = None
+        for i, j, tile in self._fetch(
+                key, level, tiles, gx, gy, complex_plane, compute, symmetry):
+            if region is None:
+                region = tile.empty(((tiles[-1][0] - i0 + 1) * size,
+                                     (tiles[-1][1] - j0 + 1) * size))
+            x, y = (i - i0) * size, (j - j0) * size
+            region[..., x:x + size, y:y + size] = tile
+
+        return region[..., (gx - i0 * size)[:, np.newaxis],
+                      (gy - j0 * size)[np.newaxis, :]]
+
+    def level(self, n, m, xmin, ymin, xmax, ymax):
+        """Return coarsest level whose pixels are no larger than the view's."""
+        level = -np.inf
+        for span, res, spacing in ((xmax - xmin, n, self.spacing[0]),
+                                   (ymax - ymin, m, self.spacing[1])):
+            if res > 1 and span > 0:
+                ratio = spacing * (res - 1) / span
+                level = max(level, math.ceil(math.log(ratio, 2) - 1e-9))
+        return 0 if level == -np.inf else int(level)
+
+    def nearestLevel(self, n, m, xmin, ymin, xmax, ymax):
+        """Return level whose pixels are nearest in scale to the view's."""
+        for span, res, spacing in ((xmax - xmin, n, self.spacing[0]),
+                                   (ymax - ymin, m, self.spacing[1])):
+            if res > 1 and span > 0:
+                return int(round(math.log(spacing * (res - 1) / span, 2)))
+        return 0
+
+    def snapView(self, n, m, xmin, ymin, xmax, ymax, level):
+        """
+        Return view, (xmin, ymin, xmax, ymax), whose pixels are lattice
+        points of given level, centred on the lattice point nearest the
+        centre of the view given.
+        """
+        snapped = []
+        for vmin, vmax, res, axis in ((xmin, xmax, n, 0), (ymin, ymax, m, 1)):
+            spacing = self.spacing[axis] / 2.0 ** level
+            start = (vmin + vmax - (res - 1) * spacing) / 2
+            index = round((start - self.origin[axis]) / spacing)
+            start = self.origin[axis] + index * spacing
+            snapped.append((start, start + (res - 1) * spacing))
+        (xmin, xmax), (ymin, ymax) = snapped
+        return (xmin, ymin, xmax, ymax)
+
+    def isAligned(self, n, m, xmin, ymin, xmax, ymax):
+        """Return whether every pixel of a view is a lattice point of the
+           level it would be composed from."""
+        level = self.level(n, m, xmin, ymin, xmax, ymax)
+        for vmin, vmax, res, axis in ((xmin, xmax, n, 0), (ymin, ymax, m, 1)):
+            spacing = self.spacing[axis] / 2.0 ** level
+            offsets = (np.array([vmin, vmax]) - self.origin[axis]) / spacing
+            indices = np.round(offsets)
+            if np.any(np.absolute(offsets - indices) > 1e-6):
+                return False
+            # Pixels must be a whole number of lattice points apart.
+            if res > 1 and (indices[1] - indices[0]) % (res - 1):
+                return False
+        return True
+
+    def tiles(self, gx, gy):
+        """Return list of (i, j) of tiles covering given lattice indices,
+           ordered by i then j."""
+        size = Pyramid.TILE_SIZE
+        return [
+            (i, j)
+            for i in range(gx.min() // size, gx.max() // size + 1)
+            for j in range(gy.min() // size, gy.max() // size + 1)
+        ]
+
+    def tileBounds(self, level, i, j):
+        """Return (n, m, xmin, ymin, xmax, ymax) of given tile."""
+        size = Pyramid.TILE_SIZE
+        dx = self.spacing[0] / 2.0 ** level
+        dy = self.spacing[1] / 2.0 ** level
+        xmin = self.origin[0] + i * size * dx
+        ymin = self.origin[1] + j * size * dy
+        return (size, size,
+                xmin, ymin, xmin + (size - 1) * dx, ymin + (size - 1) * dy)
+
+    def clear(self):
+        self._tiles.clear()
+
+    def _latticeIndices(self, vmin, vmax, res, axis, level):
+        """Return index of the lattice point nearest to each view pixel."""
+        spacing = self.spacing[axis] / 2.0 ** level
+        values = np.linspace(vmin, vmax, res)
+        # Break ties between lattice points upwards, regardless of rounding
+        # error, so that a band of a view maps as the whole view does.
+        offsets = (values - self.origin[axis]) / spacing
+        return np.floor(offsets + (0.5 + 1e-6)).astype(np.int64)
+
+    def _fetch(self, key, level, tiles, gx, gy, complex_plane, compute,
+               symmetry):
+        """Yield (i, j, tile) for each tile, whose pixels at lattice indices
+           gx x gy are valid."""
+        size = Pyramid.TILE_SIZE
+        half = size // 2
+        index_of = np.arange(size * size).reshape(size, size)
+
+        # Plan how each needed pixel missing from the cache is obtained:
+        # decimated from a cached child, mirroring a pixel either cached or
+        # obtained before it, or else computed.
+        entries = {}
+        plans = []
+        for i, j in tiles:
+            entry = self._tiles.get((key, level, i, j))
+            valid = np.zeros((size, size), dtype=bool)
+            if entry is not None:
+                valid = entry.valid
+            x = gx[(gx >= i * size) & (gx < (i + 1) * size)] - i * size
+            y = gy[(gy >= j * size) & (gy < (j + 1) * size)] - j * size
+            missing = np.zeros((size, size), dtype=bool)
+            missing[x[:, np.newaxis], y[np.newaxis, :]] = True
+            missing &= ~valid
+            if not missing.any():
+                entries[(i, j)] = entry
+                continue
+
+            rest = missing.copy()
+            copies = []
+            for a, b, child in self._children(key, level, i, j):
+                cx = np.clip(2 * (np.arange(size) - a * half), 0, size - 1)
+                cy = np.clip(2 * (np.arange(size) - b * half), 0, size - 1)
+                block = np.zeros((size, size), dtype=bool)
+                block[a * half:(a + 1) * half, b * half:(b + 1) * half] = True
+                block &= rest & child.valid[cx[:, np.newaxis], cy]
+                if block.any():
+                    rest &= ~block
+                    copies.append((child, cx, cy, block))
+
+            mirror = None
+            if symmetry is not None:
+                mirror = self._mirror(level, i, j, symmetry)
+            own = None
+            for source, block in self._mirrorBlocks(mirror):
+                mx = np.clip(mirror[0] - source[0] * size, 0, size - 1)
+                my = np.clip(mirror[1] - source[1] * size, 0, size - 1)
+                if source == (i, j):
+                    own = (mx, my, block)
+                    continue
+                if source not in entries:
+                    entries[source] = self._tiles.get((key, level) + source)
+                if entries[source] is None:
+                    continue
+                block &= rest & entries[source].valid[mx[:, np.newaxis], my]
+                if block.any():
+                    rest &= ~block
+                    copies.append((entries[source], mx, my, block))
+
+            tile = _Tile(None if entry is None else entry.result,
+                         valid | missing)
+            if own is not None:
+                # Tile overlaps its own mirror image; copy pixels mirroring
+                # ones obtained otherwise, or computed as they come first.
+                mx, my, block = own
+                mx, my = mx[:, np.newaxis], my[np.newaxis, :]
+                obtained = (valid | missing) & ~rest
+                first = rest[mx, my] & (mx * size + my < index_of)
+                block &= rest & (obtained[mx, my] | first)
+                if block.any():
+                    rest &= ~block
+                    copies.append((tile, mx[:, 0], my[0], block))
+
+            plans.append((i, j, tile, rest, copies))
+            # Later tiles may mirror this one as it will be.
+            entries[(i, j)] = tile
+
+        # Compute all remaining pixels in a single pass.
+        values = None
+        points = [
+            complex_plane(*self.tileBounds(level, i, j))[rest]
+            for i, j, _, rest, _ in plans
+        ]
+        if sum(p.size for p in points):
+            values = compute(np.concatenate(points).reshape(-1, 1))
+            values = values.reshape(values.shape[:-2] + (-1,))
+
+        offset = 0
+        for i, j, tile, rest, copies in plans:
+            if tile.result is None:
+                # Every pixel is computed, or else copied from a source tile.
+                template = copies[0][0].result if values is None else values
+                tile.result = template.zeros((size, size))
+            count = rest.sum()
+            if count:
+                tile.result[..., rest] = values[..., offset:offset + count]
+                offset += count
+            for source, ix, iy, block in copies:
+                copied = source.result[..., ix[:, np.newaxis], iy]
+                tile.result[..., block] = copied[..., block]
+            self._tiles.put((key, level, i, j), tile)
+
+        for i, j in tiles:
+            yield i, j, entries[(i, j)].result
+
+    def _mirror(self, level, i, j, symmetry):
+        """
+        Return lattice indices of the mirror image of a tile's pixels.
+
+        :return: Tuple (x indices, y indices), or None if mirrored pixels
+                 are not lattice points
+        """
+        size = Pyramid.TILE_SIZE
+        gx = i * size + np.arange(size)
+        gy = j * size + np.arange(size)
+        mx = self._mirrorIndices(gx, 0, level) if 0 in symmetry else gx
+        my = self._mirrorIndices(gy, 1, level) if 1 in symmetry else gy
+        if mx is None or my is None:
+            return None
+        return mx, my
+
+    def _mirrorBlocks(self, mirror):
+        """Yield ((i, j) of a source tile, mask of the pixels mirroring into
+           that source tile) for each tile the mirror image overlaps."""
+        if mirror is None:
+            return
+
+        size = Pyramid.TILE_SIZE
+        mx, my = mirror
+        for si in np.unique(mx // size):
+            for sj in np.unique(my // size):
+                block = np.outer(mx // size == si, my // size == sj)
+                yield (int(si), int(sj)), block
+
+    def _mirrorIndices(self, indices, axis, level):
+        """Return lattice indices of -value for lattice indices along an axis,
+           or None if these are not lattice points."""
+        # Index k lies at origin + k * spacing, so -value lies at s - k.
+        spacing = self.spacing[axis] / 2.0 ** level
+        s = -2 * self.origin[axis] / spacing
+        if abs(s - round(s)) > 1e-6:
+            return None
+        return int(round(s)) - indices
+
+    def _children(self, key, level, i, j):
+        """Return list of (a, b, child) of the cached children of a tile,
+           child (a, b) covering quadrant (a, b) of the tile."""
+        children = []
+        for a in (0, 1):
+            for b in (0, 1):
+                child = self._tiles.get((key, level + 1, 2 * i + a, 2 * j + b))
+                if child is not None:
+                    children.append((a, b, child))
+        return children
@@ -3,8 +3,12 @@ import subprocess
 
 from PIL import Image
 
+from normalization import Normalization
+from renderstream import spill
 
-def animate_fractal_zoom(fractal, filename, start_frame, end_frame, frames):
+
+def animate_fractal_zoom(fractal, filename, start_frame, end_frame, frames,
+                         coordinator=None, pin_colors=False):
     """
     Generates a series of zoom images for a fractal.
     :param fractal: Fractal object which will be zoomed into.
@@ -12,8 +16,13 @@ def animate_fractal_zoom(fractal, filename, start_frame, end_frame, frames):
     :param start_frame: Tuple containing coordinates of the initial viewpoint.
     :param end_frame: Tuple containing coordinates of the final viewpoint.
     :param frames: Number of frames used in the animation.
+    :param coordinator: Optional distributed.Coordinator whose workers will
+                        compute the frames.
+    :param pin_colors: Whether to colorize every frame with one
+                       normalization merged from all of them, so that colors
+                       do not flicker between frames.
     """
-    zoom_count = 0
+    views = []
     for zoom_count in range(frames + 1):
         # Calculates the boundaries of the current zoom frame
         current_frame = []
@@ -21,14 +30,36 @@ def animate_fractal_zoom(fractal, filename, start_frame, end_frame, frames):
             current_frame.append((start_frame[i] +
                                     (zoom_count / float(frames) *
                                      (end_frame[i] - start_frame[i]))))
-
-        fractal.set_view_frame(*current_frame)
-        rgb_image = fractal.get_fractal_image(*current_frame)
+        views.append(current_frame)
+
+    raw_frames = None
+    if coordinator is not None:
+        raw_frames = coordinator.render(fractal, views)
+    elif pin_colors:
+        raw_frames = _computeFrames(fractal, views)
+
+    normalization = None
+    if pin_colors:
+        # Frames are merged as they are computed, then spilled to disk until
+        # colorized, rather than all held in memory.
+        normalization = Normalization()
+        raw_frames = spill(
+            raw_frames, normalization, fractal.equalizeHistogram)
+    if raw_frames is not None:
+        raw_frames = iter(raw_frames)
+
+    for zoom_count, current_frame in enumerate(views):
+        fractal.setView(*current_frame)
+        if raw_frames is not None:
+            rgb_image = fractal.colorize(next(raw_frames), normalization)
+        else:
+            rgb_image = fractal.image()
         saved_image = Image.fromarray(rgb_image, 'RGB')
         saved_image.save(filename + str(zoom_count) + '.png')
 
 
-def animate_fractal_values(fractal, filename, seed_generator, start=0, stop=1, step=0.012):
+def animate_fractal_values(fractal, filename, seed_generator, start=0, stop=1, step=0.012,
+                           pin_colors=False):
     """
     Generates an animation for a fractal using different seed values.
     :param fractal: Fractal object which will be animated.
@@ -37,27 +68,45 @@ def animate_fractal_values(fractal, filename, seed_generator, start=0, stop=1, s
     :param start: Starting value of x used in the function to generate seeds.
     :param stop: Max value of x.
     :param step: Value by which x is incremented.
+    :param pin_colors: Whether to colorize every frame with one
+                       normalization merged from all of them.
     """
     x = start
     max = stop
 
     d = step
 
-    iters = 0
+    seeds = []
     while x < max:
-        iters += 1
         x += d
+        seeds.append(seed_generator(x))
 
-        new_seeds = seed_generator(x)
-        fractal.set_seeds(**new_seeds)
+        # Safeguard so too many images are not generated if x never exceeds the max
+        if len(seeds) > 100:
+            break
 
-        rgb_image = fractal.get_fractal_image()
+    normalization = None
+    if pin_colors:
+        raw_frames = (fractal.computeView(fractal.view(), **new_seeds)
+                      for new_seeds in seeds)
+        normalization = Normalization()
+        raw_frames = spill(
+            raw_frames, normalization, fractal.equalizeHistogram)
+
+    for iters, new_seeds in enumerate(seeds, 1):
+        if pin_colors:
+            rgb_image = fractal.colorize(next(raw_frames), normalization)
+        else:
+            rgb_image = fractal.image(**new_seeds)
         saved_image = Image.fromarray(rgb_image, 'RGB')
         saved_image.save(filename + str(iters) + '.png')
 
-        # Safeguard so too many images are not generated if x never exceeds the max
-        if iters > 100:
-            break
+
+def _computeFrames(fractal, views):
+    """Yield raw fractal of each view in turn."""
+    for view in views:
+        fractal.setView(*view)
+        yield fractal.computeView(fractal.view())
 
 
 def convert_pngs_to_video(image_filename, video_filename):
@@ -0,0 +1,264 @@
+import os
+import pickle
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+from fractalresult import FractalResult
+from normalization import Normalization
+
+
+# Pixels computed at once; bounds memory use independently of image size.
+BAND_PIXELS = 1 << 21
+
+
+class PngWriter(object):
+    """Writes an RGB PNG image row by row, without holding it in memory."""
+
+    def __init__(self, filename, width, height):
+        self._file = open(filename, 'wb')
+        self._compressor = zlib.compressobj(6)
+        self._width = width
+
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bit RGB, no interlacing.
+        self._writeChunk(b'IHDR', struct.pack(
+            '!IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def writeRows(self, rows):
+        """
+        Append rows to the image.
+
+        :param rows: uint8 ndarray of shape (k, width, 3)
+        """
+        # Each row is preceded by its filter type; 0 = none.
+        scanlines = np.zeros((rows.shape[0], self._width * 3 + 1), np.uint8)
+        scanlines[:, 1:] = rows.reshape(rows.shape[0], -1)
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._writeChunk(b'IDAT', data)
+
+    def close(self):
+        self._writeChunk(b'IDAT', self._compressor.flush())
+        self._writeChunk(b'IEND', b'')
+        self._file.close()
+
+    def _writeChunk(self, chunk_type, data):
+        self._file.write(struct.pack('!I', len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff
+        self._file.write(struct.pack('!I', crc))
+
+
+class TiffWriter(object):
+    """Writes an uncompressed RGB BigTIFF image row by row, one strip per call
+       to writeRows; suitable for images beyond 4 GB."""
+
+    # Tag data types.
+    _SHORT = 3
+    _LONG8 = 16
+
+    def __init__(self, filename, width, height):
+        self._file = open(filename, 'wb')
+        self._width = width
+        self._height = height
+        self._rowsPerStrip = None
+        self._stripOffsets = []
+        self._stripByteCounts = []
+
+        # Little-endian BigTIFF header; first IFD offset is written on close.
+        self._file.write(b'II' + struct.pack('<HHHQ', 43, 8, 0, 0))
+
+    def writeRows(self, rows):
+        """
+        Append rows to the image. All calls but the last must pass the same
+        number of rows.
+
+        :param rows: uint8 ndarray of shape (k, width, 3)
+        """
+        if self._rowsPerStrip is None:
+            self._rowsPerStrip = rows.shape[0]
+
+        data = np.ascontiguousarray(rows, dtype=np.uint8).tobytes()
+        self._stripOffsets.append(self._file.tell())
+        self._stripByteCounts.append(len(data))
+        self._file.write(data)
+
+    def close(self):
+        offsets_pos = self._writeArray(self._stripOffsets)
+        counts_pos = self._writeArray(self._stripByteCounts)
+        strips = len(self._stripOffsets)
+        if self._file.tell() % 2:
+            self._file.write(b'\0')
+
+        entries = [
+            (256, TiffWriter._LONG8, 1, self._width),
+            (257, TiffWriter._LONG8, 1, self._height),
+            (258, TiffWriter._SHORT, 3, struct.pack('<HHHH', 8, 8, 8, 0)),
+            (259, TiffWriter._SHORT, 1, 1),     # No compression.
+            (262, TiffWriter._SHORT, 1, 2),     # RGB.
+            (273, TiffWriter._LONG8, strips, offsets_pos),
+            (277, TiffWriter._SHORT, 1, 3),
+            (278, TiffWriter._LONG8, 1, self._rowsPerStrip or self._height),
+            (279, TiffWriter._LONG8, strips, counts_pos),
+            (284, TiffWriter._SHORT, 1, 1),     # Chunky pixels.
+        ]
+        ifd_pos = self._file.tell()
+        self._file.write(struct.pack('<Q', len(entries)))
+        for tag, data_type, count, value in entries:
+            if data_type == TiffWriter._SHORT and count == 1:
+                value = struct.pack('<HHHH', value, 0, 0, 0)
+            elif not isinstance(value, bytes):
+                value = struct.pack('<Q', value)
+            self._file.write(struct.pack('<HHQ', tag, data_type, count) + value)
+        self._file.write(struct.pack('<Q', 0))
+
+        self._file.seek(8)
+        self._file.write(struct.pack('<Q', ifd_pos))
+        self._file.close()
+
+    def _writeArray(self, values):
+        """Write LONG8 array, returning its offset; single values are stored
+           within the IFD entry itself."""
+        if len(values) == 1:
+            return values[0]
+        position = self._file.tell()
+        self._file.write(np.asarray(values, dtype='<u8').tobytes())
+        return position
+
+
+def render_to_file(fractal, filename, raw_filename=None, band_height=None,
+                   normalization=None):
+    """
+    Renders the fractal's current view band by band, streaming each band to
+    disk so that memory use is bounded by the band size rather than by the
+    resolution. Every band is colorized with the same normalization, so
+    that the image has no seams between bands.
+    :param fractal: Fractal object to render, at its xres by yres resolution.
+    :param filename: Image filename; a .png, or a .tif/.tiff for BigTIFF.
+    :param raw_filename: Optional .npy file storing the raw fractal as
+                         records of its components (see
+                         FractalResult.toRecords), laid out as
+                         (..., yres, xres) and readable with
+                         np.load(raw_filename, mmap_mode='r').
+    :param band_height: Rows per band; defaults to about BAND_PIXELS pixels.
+    :param normalization: Normalization colorizing the bands; defaults to
+                          fractal.normalization, else, if the fractal needs
+                          one, see Fractal.needsNormalization, one merged
+                          from every band in a first pass. Bands are then
+                          read back from raw_filename, or else spilled to a
+                          temporary file in the meantime.
+    """
+    # Bands of image rows are bands of x for transposed images, else of y.
+    if fractal.TRANSPOSED:
+        axis, width, height = 0, fractal.yres, fractal.xres
+    else:
+        axis, width, height = 1, fractal.xres, fractal.yres
+    if band_height is None:
+        band_height = max(1, BAND_PIXELS // width)
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.tif', '.tiff'):
+        writer = TiffWriter(filename, width, height)
+    else:
+        writer = PngWriter(filename, width, height)
+
+    bands = _storeRaw(
+        fractal.computeBands(band_height, axis), raw_filename, axis,
+        (fractal.yres, fractal.xres))
+    if normalization is None:
+        normalization = fractal.normalization
+    if normalization is None and fractal.needsNormalization():
+        normalization = Normalization()
+        if raw_filename is None:
+            bands = spill(bands, normalization, fractal.equalizeHistogram)
+        else:
+            bands = _rereadRaw(
+                bands, normalization, fractal.equalizeHistogram,
+                raw_filename, axis, band_height)
+
+    try:
+        for band in bands:
+            writer.writeRows(fractal.colorize(band, normalization))
+    finally:
+        writer.close()
+
+
+def _storeRaw(bands, raw_filename, axis, shape):
+    """
+    Yield raw fractal bands, storing each to a .npy file as it is computed.
+
+    :param bands: Iterable of (start, stop, band) as from Fractal.computeBands
+    :param raw_filename: .npy file, or None to store nothing
+    :param shape: Tuple (yres, xres) of the whole view
+    """
+    raw_store = None
+    try:
+        for start, stop, band in bands:
+            if raw_filename is not None:
+                records = np.swapaxes(band.toRecords(), -1, -2)
+                if raw_store is None:
+                    raw_store = np.lib.format.open_memmap(
+                        raw_filename, mode='w+', dtype=records.dtype,
+                        shape=records.shape[:-2] + shape)
+                if axis:
+                    raw_store[..., start:stop, :] = records
+                else:
+                    raw_store[..., :, start:stop] = records
+                raw_store.flush()
+            yield band
+    finally:
+        del raw_store
+
+
+def _rereadRaw(bands, normalization, histogram, raw_filename, axis, size):
+    """
+    Yield bands once all of them have been merged into normalization,
+    reading them back from the .npy file _storeRaw stored them to.
+
+    :param size: Pixels spanned by each band along axis, as computed
+    """
+    scale = 1.0
+    for band in bands:
+        normalization.update(band, histogram)
+        scale = band.scale
+
+    raw_store = np.load(raw_filename, mmap_mode='r')
+    try:
+        # Records are laid out (..., yres, xres).
+        length = raw_store.shape[-1 - axis]
+        for start in range(0, length, size):
+            if axis:
+                records = raw_store[..., start:start + size, :]
+            else:
+                records = raw_store[..., :, start:start + size]
+            yield FractalResult.fromRecords(
+                np.swapaxes(records, -1, -2), scale)
+    finally:
+        del raw_store
+
+
+def spill(results, normalization, histogram=True):
+    """
+    Yield raw results, e.g. the bands of an image or the frames of an
+    animation, once all of them have been merged into normalization.
+
+    Results are pickled to a temporary file in the meantime, so that memory
+    use stays bounded by the size of one result and none is computed twice.
+
+    :param histogram: Whether to merge histograms of the results, which
+                      only histogram equalization needs
+    """
+    with tempfile.TemporaryFile() as spilled:
+        count = 0
+        for result in results:
+            normalization.update(result, histogram)
+            pickle.dump(result, spilled, pickle.HIGHEST_PROTOCOL)
+            count += 1
+
+        spilled.seek(0)
+        for _ in range(count):
+            yield pickle.load(spilled)
@@ -1,20 +1,26 @@
 import numpy as np
 
 
-def adjustRange(a, vmin=0, vmax=255):
+def adjustRange(a, vmin=0, vmax=255, amax=None):
     """
     Return array with values compressed into given range.
 
     :type a: np.ndarray
     :param vmin: Minimum value
     :param vmax: Maximum value
+    :param amax: Value mapped to vmax, e.g. the maximum over every tile of a
+                 frame; defaults to the maximum of a. Larger values are
+                 clipped to vmax.
     :return: Array with values ranging from vmin to vmax.
     :rtype: np.ndarray
     """
+    if amax is None:
+        amax = np.nanmax(a)
+
     new_a = (
         (
             # Represent array as floats ranging between 0 and 1.
-            a.astype(dtype=float) / np.nanmax(a)
+            np.minimum(a.astype(dtype=float) / amax, 1)
 
             # Fill given range.
             * (vmax - vmin) + vmin
@@ -24,3 +30,149 @@ def adjustRange(a, vmin=0, vmax=255):
     )
 
     return new_a
+
+
+def edgeMask(a, threshold):
+    """
+    Return mask of elements differing sharply from any of their neighbours.
+
+    :param a: Array of shape (n, m), or (k, n, m) for k components
+    :param threshold: Minimum difference between neighbouring elements
+    :return: Boolean array of shape (n, m)
+    :rtype: np.ndarray
+    """
+    a = np.asarray(a, dtype=float)
+    if a.ndim == 2:
+        a = a[np.newaxis]
+
+    mask = np.zeros(a.shape[-2:], dtype=bool)
+    for component in a:
+        # Mark both elements of each sharply differing pair.
+        x_edges = np.absolute(np.diff(component, axis=0)) > threshold
+        y_edges = np.absolute(np.diff(component, axis=1)) > threshold
+        mask[1:, :] |= x_edges
+        mask[:-1, :] |= x_edges
+        mask[:, 1:] |= y_edges
+        mask[:, :-1] |= y_edges
+
+    return mask
+
+
+def jitterOffsets(samples, seed=0):
+    """
+    Return stratified, jittered sub-pixel offsets.
+
+    The pixel is divided into a k x k grid, k = ceil(sqrt(samples)), with one
+    random offset per cell. A fixed seed keeps animations from flickering.
+
+    :param samples: Minimum number of offsets
+    :return: Complex array of offsets in pixel units, within [-0.5, 0.5)
+    :rtype: np.ndarray
+    """
+    k = int(np.ceil(np.sqrt(samples)))
+    jitter = np.random.RandomState(seed).random_sample((2, k, k))
+    iy, ix = np.mgrid[0:k, 0:k]
+    real_part = (ix + jitter[0]) / k - 0.5
+    imag_part = (iy + jitter[1]) / k - 0.5
+    return (real_part + imag_part * complex(0, 1)).ravel()
+
+
+def mirrorPixels(bounds, axes):
+    """
+    Return pixels of a plane which mirror other pixels of the same plane.
+
+    Of each mirrored pair only the later pixel is flagged, and only where 
+    mirrored pixels fall exactly onto the pixel grid.
+
+    :param bounds: Tuple (n, m, xmin, ymin, xmax, ymax) of the plane
+    :param axes: Axes negated by mirroring; (1,) mirrors about the real axis
+    :return: Tuple (mask of shape (n, m), i and j of the pixel each flagged 
+             pixel mirrors), or None if few pixels mirror one another
+    """
+    n, m, xmin, ymin, xmax, ymax = bounds
+    mi = _mirrorIndices(xmin, xmax, n) if 0 in axes else np.arange(n)
+    mj = _mirrorIndices(ymin, ymax, m) if 1 in axes else np.arange(m)
+    if mi is None or mj is None:
+        return None
+
+    valid = (((mi >= 0) & (mi < n))[:, np.newaxis]
+             & ((mj >= 0) & (mj < m))[np.newaxis, :])
+    index = np.arange(n * m).reshape(n, m)
+    mirror_index = mi[:, np.newaxis] * m + mj[np.newaxis, :]
+    mask = valid & (mirror_index < index)
+    if mask.sum() < 0.05 * mask.size:
+        return None
+
+    flagged_i, flagged_j = np.nonzero(mask)
+    return mask, mi[flagged_i], mj[flagged_j]
+
+
+def _mirrorIndices(vmin, vmax, res):
+    """Return index of the pixel at -value for each pixel of an axis, or None
+       if these do not coincide with pixels."""
+    if res < 2 or vmax == vmin:
+        return None
+
+    # Pixel k lies at vmin + k * step, so -value lies at index s - k.
+    step = (vmax - vmin) / float(res - 1)
+    s = -2 * vmin / step
+    if abs(s - round(s)) > 1e-6:
+        return None
+    return int(round(s)) - np.arange(res)
+
+
+def powerFunction(p):
+    """
+    Return function raising complex arrays to a real power, as np.power does
+    but choosing a cheaper method for the given power.
+
+    Integer powers are built by repeated squaring, half-integer powers from
+    an integer power and a square root, and other powers in polar form from
+    the magnitude of z, which callers usually have to hand.
+
+    :param p: Real power
+    :return: Function f(z, magnitude) returning z ** p, given magnitude = |z|
+    """
+    if p == int(p):
+        p = int(p)
+        if p == 2:
+            # Runs much faster than np.power(z, 2).
+            return lambda z, magnitude: np.square(z)
+        return lambda z, magnitude: _integerPower(z, p)
+
+    if 2 * p == int(2 * p):
+        # z^(k + 1/2) = z^k * sqrt(z), both on the principal branch.
+        k = int(np.floor(p))
+        return lambda z, magnitude: _integerPower(z, k) * np.sqrt(z)
+
+    def polarPower(z, magnitude):
+        # Overflowed orbits are left to np.power, which is quicker on them, 
+        # as is zero, whose angle is undefined.
+        polar = np.isfinite(magnitude) & (magnitude != 0)
+        power = np.power(z, p, out=np.empty_like(z), where=np.invert(polar))
+
+        scale = np.power(
+            magnitude, p, out=np.zeros_like(magnitude), where=polar)
+        angle = np.arctan2(
+            z.imag, z.real, out=np.zeros_like(magnitude), where=polar)
+        angle *= p
+        np.multiply(scale, np.cos(angle), out=power.real, where=polar)
+        np.multiply(scale, np.sin(angle), out=power.imag, where=polar)
+        return power
+
+    return polarPower
+
+
+def _integerPower(z, k):
+    """Return z ** k for integer k, by repeated squaring."""
+    if k < 0:
+        return np.reciprocal(_integerPower(z, -k))
+
+    power = None
+    while k:
+        if k & 1:
+            power = z if power is None else power * z
+        k >>= 1
+        if k:
+            z = np.square(z)
+    return np.ones_like(z) if power is None else power
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+# Modules import one another as in src/, which is run as the working
+# directory; the code is written for Python 2.
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path[:0] = [SOURCE, os.path.join(SOURCE, "fractals")]
+if not hasattr(builtins, "xrange"):
+    builtins.xrange = range
+
+
+@pytest.fixture(scope="session")
+def app():
+    """QApplication, which fractals' controls need; no display is used."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PyQt5")
+
+import buddhabrot
+from buddhabrot import (ANTI_BUDDHABROT, METROPOLIS, NEBULABROT, UNIFORM,
+                        Buddhabrot)
+
+
+def set_args(fractal, **values):
+    for control in fractal.controls._controls:
+        if control.key() in values:
+            control.setValue(values[control.key()])
+
+
+@pytest.fixture
+def fractal(app):
+    fractal = Buddhabrot("Buddhabrot")
+    fractal.xres, fractal.yres = 24, 24
+    fractal.itermax = 50
+    fractal.processes = 1
+    # Two tasks' worth of samples.
+    set_args(fractal, samples=1.0)
+    return fractal
+
+
+def blocks(counts, k=6):
+    n, m = counts.shape[-2:]
+    return counts.reshape(counts.shape[:-2] + (n // k, k, m // k, k)).sum(
+        axis=(-3, -1))
+
+
+def test_metropolis_sampling_matches_uniform_sampling(fractal):
+    uniform = fractal.computeView(fractal.view()).counts[0].astype(float)
+    set_args(fractal, sampler=METROPOLIS)
+    metropolis = fractal.computeView(fractal.view()).counts[0].astype(float)
+
+    # Both estimate the same histogram, block by block and in total.
+    ratios = blocks(metropolis) / blocks(uniform)
+    assert np.all(np.abs(ratios - 1) < 0.1)
+
+
+def test_nebulabrot_channels_nest(fractal):
+    fractal.itermax = 200
+    set_args(fractal, mode=NEBULABROT)
+    counts = fractal.computeView(fractal.view()).counts
+    assert counts.shape == (3, 24, 24)
+    # Channels trace the same orbits, cut off at ever fewer iterations.
+    assert np.all(counts[0] >= counts[1]) and np.all(counts[1] >= counts[2])
+    assert counts[0].sum() > counts[1].sum() > counts[2].sum() > 0
+
+
+def test_anti_buddhabrot_traces_bounded_orbits(fractal):
+    escaping = fractal.computeView(fractal.view()).counts[0]
+    set_args(fractal, mode=ANTI_BUDDHABROT)
+    bounded = fractal.computeView(fractal.view()).counts[0]
+
+    # Only escaping orbits reach beyond |z| = 2.
+    plane = fractal._complexPlane(24, 24, *fractal.view())
+    outside = np.absolute(plane) > 2.1
+    assert outside.any()
+    assert np.all(bounded[outside] == 0) and escaping[outside].any()
+    assert bounded.sum() > 0
+
+
+def test_checkpoints_resume_finished_tasks(fractal, tmpdir, monkeypatch):
+    fractal.checkpoint = str(tmpdir.join("buddhabrot.npz"))
+    first = fractal.computeView(fractal.view())
+
+    def fail(task):
+        raise AssertionError("finished task computed again")
+
+    fractal._results.clear()
+    monkeypatch.setattr(buddhabrot, "_accumulate", fail)
+    resumed = fractal.computeView(fractal.view())
+    assert np.array_equal(first.counts, resumed.counts)
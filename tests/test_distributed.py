@@ -0,0 +1,154 @@
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from distributed import AuthenticationError, Connection, Coordinator, work
+from fractalresult import FractalResult
+
+
+class Controls(object):
+    def args(self):
+        return {}
+
+
+class Fractal(object):
+    """Describes tasks as a fractal would; workers here compute nothing."""
+    _id = 0
+    controls = Controls()
+    xres, yres = 5, 4
+    itermax = 10
+    aaSamples = 0
+    aaThreshold = 1
+    pointwise = True
+
+    def _isPointwise(self, **kwargs):
+        return self.pointwise
+
+
+def expected_frame():
+    x, y = np.mgrid[0:Fractal.xres, 0:Fractal.yres]
+    return x * 10 + y
+
+
+def start_worker(coordinator, failures=(), tiles=None):
+    """
+    Start a worker answering each task with counts of x * 10 + y, once the
+    listed failures are used up: "error" reports an error for a task and
+    "lost" disconnects while computing it. Tiles of the tasks answered are
+    appended to tiles, if given.
+    """
+    failures = list(failures)
+    connection = Connection(socket.create_connection(coordinator.address))
+    connection.authenticate(coordinator.authkey, "worker", "coordinator")
+
+    def run():
+        try:
+            while True:
+                message = connection.receive()
+                if message[0] == "stop":
+                    return
+                _, task_id, spec = message
+                failure = failures.pop(0) if failures else None
+                if failure == "lost":
+                    return
+                if failure == "error":
+                    connection.send(("error", task_id, "Traceback"))
+                    continue
+
+                if tiles is not None:
+                    tiles.append(spec["tile"])
+                x0, y0, x1, y1 = spec["tile"]
+                x, y = np.mgrid[x0:x1, y0:y1]
+                raw = FractalResult(counts=(x * 10 + y).astype(np.uint16))
+                connection.send(("result", task_id, raw))
+        except (socket.error, EOFError):
+            pass
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def coordinator():
+    coordinator = Coordinator(heartbeat_timeout=5.0, max_retries=2)
+    yield coordinator
+    coordinator.close()
+
+
+def test_tiles_are_assembled_into_frames(coordinator):
+    start_worker(coordinator)
+    start_worker(coordinator)
+    frames = coordinator.render(Fractal(), [(-1, -1, 1, 1)] * 3, tile_size=3)
+    assert len(frames) == 3
+    for frame in frames:
+        assert np.array_equal(frame.counts, expected_frame())
+
+
+def test_non_pointwise_frames_are_single_tasks(coordinator):
+    fractal = Fractal()
+    fractal.pointwise = False
+    tiles = []
+    start_worker(coordinator, tiles=tiles)
+    frames = coordinator.render(fractal, [(-1, -1, 1, 1)] * 2, tile_size=2)
+    assert tiles == [(0, 0, Fractal.xres, Fractal.yres)] * 2
+    for frame in frames:
+        assert np.array_equal(frame.counts, expected_frame())
+
+
+def test_workers_render_as_the_fractal_does(app, coordinator):
+    from mandelbrot import Mandelbrot
+
+    fractal = Mandelbrot("Mandelbrot Set")
+    fractal.xres, fractal.yres = 40, 30
+    views = [(-2.0, -1.0, 0.5, 1.0), (-0.8, -0.25, -0.6, -0.05)]
+    worker = threading.Thread(
+        target=work, args=coordinator.address + (coordinator.authkey,))
+    worker.daemon = True
+    worker.start()
+
+    frames = coordinator.render(fractal, views, tile_size=16)
+    for view, frame in zip(views, frames):
+        fractal.setView(*view)
+        expected = fractal.computeView(fractal.view())
+        assert np.array_equal(frame.value(), expected.value())
+
+
+def test_failed_tiles_are_retried(coordinator):
+    # Failed tiles are retried first, so one tile fails max_retries times.
+    start_worker(coordinator, ["error", "error"])
+    frames = coordinator.render(Fractal(), [(-1, -1, 1, 1)], tile_size=2)
+    assert np.array_equal(frames[0].counts, expected_frame())
+
+
+def test_tiles_of_lost_workers_are_retried(coordinator):
+    start_worker(coordinator, ["lost"])
+    coordinator.waitForWorkers(1, timeout=5)
+    start_worker(coordinator)
+    frames = coordinator.render(Fractal(), [(-1, -1, 1, 1)], tile_size=2)
+    assert np.array_equal(frames[0].counts, expected_frame())
+
+
+def test_tiles_failing_too_often_abort_the_job(coordinator):
+    start_worker(coordinator, ["error"] * 3)
+    with pytest.raises(RuntimeError, match="failed 3 times"):
+        coordinator.render(Fractal(), [(-1, -1, 1, 1)], tile_size=8)
+
+    # The coordinator takes further jobs.
+    frames = coordinator.render(Fractal(), [(-1, -1, 1, 1)], tile_size=8)
+    assert np.array_equal(frames[0].counts, expected_frame())
+
+
+def test_workers_must_hold_the_authkey(coordinator):
+    connection = Connection(socket.create_connection(coordinator.address))
+    try:
+        with pytest.raises(AuthenticationError):
+            connection.authenticate(b"wrong", "worker", "coordinator")
+    finally:
+        connection.close()
+    assert coordinator.workerCount() == 0
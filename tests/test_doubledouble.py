@@ -0,0 +1,145 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from doubledouble import DDComplex, add, divide, multiply, twoProduct, \
+    twoSum
+
+
+def exact(hi, lo):
+    return Fraction(float(hi)) + Fraction(float(lo))
+
+
+def test_error_free_transformations():
+    rng = np.random.RandomState(0)
+    a = rng.normal(size=50) * 1e8
+    b = rng.normal(size=50) * 1e-8
+    for x, y in zip(a, b):
+        s, e = twoSum(x, y)
+        assert exact(s, e) == Fraction(x) + Fraction(y)
+        p, e = twoProduct(x, y)
+        assert exact(p, e) == Fraction(x) * Fraction(y)
+
+
+def test_arithmetic_keeps_106_bits():
+    third = divide(1.0, 0.0, 3.0, 0.0)
+    assert abs(exact(*third) - Fraction(1, 3)) < Fraction(1, 2 ** 106)
+
+    a = (1.0, 2.0 ** -60)
+    b = (3.0, -2.0 ** -70)
+    total = add(a[0], a[1], b[0], b[1])
+    assert exact(*total) == exact(*a) + exact(*b)
+    product = multiply(a[0], a[1], b[0], b[1])
+    assert abs(exact(*product) - exact(*a) * exact(*b)) < Fraction(1, 2 ** 100)
+
+
+def test_complex_operations_match_complex128():
+    rng = np.random.RandomState(1)
+    z = rng.normal(size=20) + 1j * rng.normal(size=20)
+    w = rng.normal(size=20) + 1j * rng.normal(size=20)
+    dz = DDComplex.fromComplex(z)
+
+    assert np.allclose(np.asarray(dz + w), z + w)
+    assert np.allclose(np.asarray(w - dz), w - z)
+    assert np.allclose(np.asarray(dz * DDComplex.fromComplex(w)), z * w)
+    assert np.allclose(np.asarray(dz.square()), z * z)
+    assert np.allclose(np.asarray(dz.reciprocal()), 1 / z)
+    assert np.allclose(np.asarray(dz ** 5), z ** 5)
+    assert np.allclose(np.asarray(dz ** -2), z ** -2.0)
+    assert np.allclose(np.asarray(dz ** 0), np.ones(20))
+    assert np.allclose(dz.absolute(), np.absolute(z))
+
+
+def test_offsets_below_float64_resolution_survive():
+    # Pixels 1e-20 apart, about the origin 0.25, are equal in float64.
+    offsets = np.arange(4) * 1e-20
+    z = DDComplex(np.full(4, 0.25), offsets, np.zeros(4), np.zeros(4))
+    squared = (z.square() - 0.0625) * 1e18
+    assert np.allclose(np.asarray(squared).real, 0.5 * offsets * 1e18)
+
+
+def test_indexing_and_reshaping():
+    z = DDComplex.fromComplex(np.arange(6) * (1 + 2j))
+    assert z.shape == (6,)
+    assert np.array_equal(np.asarray(z.reshape(2, 3)[1]), [3 + 6j, 4 + 8j,
+                                                           5 + 10j])
+    assert np.array_equal(np.asarray(z[::2].repeat(2)),
+                          [0, 0, 2 + 4j, 2 + 4j, 4 + 8j, 4 + 8j])
+    assert z[1].key() == (1.0, 0.0, 2.0, 0.0)
+
+
+def test_only_integer_powers():
+    with pytest.raises(ValueError):
+        DDComplex.fromComplex(1j) ** 0.5
+
+
+# Point on the boundary of the Mandelbrot set, near the tip of a spiral.
+DEEP_CENTRE = complex(-0.743643887037151, 0.131825904205330)
+
+
+@pytest.fixture
+def mandelbrot(app):
+    from mandelbrot import Mandelbrot
+
+    fractal = Mandelbrot("Mandelbrot Set")
+    fractal.xres, fractal.yres = 32, 24
+    fractal.aaSamples = 0
+    return fractal
+
+
+def centred_view(centre, width, aspect=0.75):
+    return (centre.real - width / 2, centre.imag - width * aspect / 2,
+            centre.real + width / 2, centre.imag + width * aspect / 2)
+
+
+def test_zooming_switches_precision(mandelbrot):
+    from fractal import Fractal
+
+    width = Fractal.DOUBLE_DOUBLE_WIDTH * 4
+    mandelbrot.setView(*centred_view(DEEP_CENTRE, width))
+    assert not mandelbrot.doubleDouble
+
+    mandelbrot.zoom(0.9)
+    assert mandelbrot.doubleDouble
+    # The view is held relative to its centre.
+    origin = complex(np.asarray(mandelbrot.viewOrigin))
+    assert abs(origin - DEEP_CENTRE) < width
+    assert max(abs(bound) for bound in mandelbrot.view()) < width
+
+    mandelbrot.zoom(-9.0)
+    assert not mandelbrot.doubleDouble
+    xmin, ymin, xmax, ymax = mandelbrot.view()
+    assert abs(complex(xmin + xmax, ymin + ymax) / 2 - DEEP_CENTRE) < width
+
+
+def test_double_double_matches_float64_at_moderate_zooms(mandelbrot,
+                                                         monkeypatch):
+    from fractal import Fractal
+
+    view = centred_view(DEEP_CENTRE, 1e-6)
+    mandelbrot.setView(*view)
+    expected = mandelbrot.computeView(mandelbrot.view())
+
+    monkeypatch.setattr(Fractal, "DOUBLE_DOUBLE_WIDTH", 1.0)
+    mandelbrot.setView(*view)
+    assert mandelbrot.doubleDouble
+    deep = mandelbrot.computeView(mandelbrot.view())
+    assert np.array_equal(deep.counts, expected.counts)
+    assert np.allclose(deep.fractions, expected.fractions, atol=1e-4)
+
+
+def test_double_double_resolves_views_float64_cannot(mandelbrot):
+    # About the Misiurewicz point i, orbits part from its repelling cycle
+    # at rates set by their distance from it, though float64 spaces
+    # imaginary parts there 2.2e-16 apart.
+    mandelbrot.itermax = 100
+    view = centred_view(complex(0, 1), 1e-15)
+    plane = mandelbrot._complexPlane(32, 24, *view)
+    assert np.unique(plane.imag).size <= 8
+
+    mandelbrot.setView(*view)
+    assert mandelbrot.doubleDouble
+    values = mandelbrot.computeView(mandelbrot.view()).value()
+    # Every pixel of a column differs.
+    assert np.unique(values[3]).size == 24
@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from mandelbrot import Mandelbrot
+import utils
+
+
+# View across the edge of the main cardioid, with little interior.
+EDGE_VIEW = (-0.8, -0.25, -0.6, -0.05)
+
+
+@pytest.fixture
+def mandelbrot(app):
+    fractal = Mandelbrot("Mandelbrot Set")
+    fractal.xres, fractal.yres = 48, 40
+    fractal.setView(*EDGE_VIEW)
+    return fractal
+
+
+def supersampled(fractal, k=4):
+    """Return values of the current view, each the mean of a regular k by k
+       grid of samples over its pixel."""
+    view = fractal.view()
+    plane = fractal._complexPlane(fractal.xres, fractal.yres, *view)
+    dx = (view[2] - view[0]) / (fractal.xres - 1)
+    dy = (view[3] - view[1]) / (fractal.yres - 1)
+    steps = (np.arange(k) + 0.5) / k - 0.5
+    offsets = (steps[:, np.newaxis] * dx + steps[np.newaxis, :] * dy * 1j)
+    samples = plane[..., np.newaxis] + offsets.ravel()
+    raw = fractal._computePoints(
+        samples.ravel(), fractal.itermax, **fractal.controls.args())
+    return raw.value().reshape(plane.shape + (-1,)).mean(axis=-1)
+
+
+def test_antialiasing_only_changes_edge_pixels(mandelbrot):
+    mandelbrot.aaSamples = 0
+    aliased = mandelbrot.image()
+    edges = utils.edgeMask(
+        mandelbrot.computeView(mandelbrot.view()).components(),
+        mandelbrot.aaThreshold)
+
+    mandelbrot.aaSamples = 16
+    antialiased = mandelbrot.image()
+    changed = np.any(aliased != antialiased, axis=-1)
+
+    # Images are laid out (yres, xres, 3).
+    assert changed.shape == edges.T.shape
+    assert changed.any()
+    assert not np.any(changed & ~edges.T)
+    assert edges.mean() < 0.5
+
+
+def test_antialiasing_approaches_supersampling(mandelbrot):
+    reference = supersampled(mandelbrot)
+    mandelbrot.aaSamples = 0
+    aliased = mandelbrot.computeView(mandelbrot.view()).value()
+    mandelbrot.aaSamples = 16
+    antialiased = mandelbrot.computeView(mandelbrot.view()).value()
+
+    aliased_error = np.absolute(aliased - reference).mean()
+    antialiased_error = np.absolute(antialiased - reference).mean()
+    assert antialiased_error < 0.5 * aliased_error
+
+
+def test_tiles_match_the_whole_view(mandelbrot):
+    whole = mandelbrot.computeView(mandelbrot.view())
+    for y0 in range(0, 40, 16):
+        tile = mandelbrot.computeTile(10, y0, 48, min(y0 + 16, 40))
+        assert np.array_equal(
+            tile.value(), whole[..., 10:48, y0:y0 + 16].value())
+
+
+def test_pyramid_zooms_by_powers_of_two(mandelbrot):
+    mandelbrot.usePyramid = True
+    mandelbrot.resetZoom()
+    pyramid = mandelbrot._tilePyramid((mandelbrot.xres, mandelbrot.yres))
+    width = mandelbrot.view()[2] - mandelbrot.view()[0]
+    for factor, scale in ((0.1, 0.5), (0.5, 0.25), (-0.1, 0.5), (-1.0, 1.0),
+                          (-3.0, 4.0)):
+        mandelbrot.zoom(factor)
+        view = mandelbrot.view()
+        assert pyramid.isAligned(mandelbrot.xres, mandelbrot.yres, *view)
+        assert np.isclose(view[2] - view[0], width * scale)
+
+
+def test_pyramid_views_match_direct_renders(mandelbrot):
+    mandelbrot.usePyramid = True
+    mandelbrot.resetZoom()
+    for factor in (0, -1.0, 0.5, 0.5, 0.5, -1.0, -1.0):
+        mandelbrot.zoom(factor)
+        composed = mandelbrot.computeView(mandelbrot.view())
+        mandelbrot.usePyramid = False
+        direct = mandelbrot.computeView(mandelbrot.view())
+        mandelbrot.usePyramid = True
+        assert np.array_equal(composed.counts, direct.counts)
+        assert np.allclose(composed.fractions, direct.fractions, atol=1e-9)
+
+
+@pytest.mark.parametrize("name, view", [
+    ("MANDELBROT", (-2.0, -1.0, 1.0, 1.0)),
+    ("JULIA", (-1.5, -1.0, 1.5, 1.0)),
+    ("PHEONIX", (-1.5, -1.0, 1.5, 1.0)),
+])
+def test_symmetric_views_match_direct_computation(app, name, view):
+    from fractals import fractals
+
+    fractal = type(getattr(fractals, name))(getattr(fractals, name).name)
+    fractal.xres, fractal.yres = 31, 21
+    fractal.aaSamples = 0
+    fractal.setView(*view)
+    args = fractal.controls.args()
+    computed = []
+    compute = fractal._computeRaw
+
+    def counting(plane, itermax, **kwargs):
+        computed.append(plane.size)
+        return compute(plane, itermax, **kwargs)
+
+    fractal._computeRaw = counting
+    symmetric = fractal.computeView(fractal.view())
+    plane = fractal._complexPlane(31, 21, *fractal.view())
+    direct = compute(plane, fractal.itermax, **args)
+
+    # Only one pixel of each mirrored pair, and those on the axes, are
+    # computed.
+    assert sum(computed) < 0.6 * plane.size
+    assert np.array_equal(symmetric.value(), direct.value())
+
+
+@pytest.mark.parametrize("p", [3, 2.5, -2, -1.5])
+def test_powers_match_np_power(mandelbrot, monkeypatch, p):
+    mandelbrot.controls._controls[0].setValue(p)
+    assert mandelbrot.controls.args() == {"p": p}
+    mandelbrot.aaSamples = 0
+    fast = mandelbrot.computeView(mandelbrot.view())
+
+    monkeypatch.setattr(utils, "powerFunction",
+                        lambda p: lambda z, magnitude: np.power(z, p))
+    mandelbrot._results.clear()
+    expected = mandelbrot.computeView(mandelbrot.view())
+    assert np.array_equal(fast.counts, expected.counts)
+    assert np.allclose(fast.fractions, expected.fractions, atol=1e-4)
+
+
+@pytest.mark.parametrize("f", ["SIN", "TRIG1"])
+def test_newton_results_table_only_converged_roots(app, f):
+    import newton
+
+    fractal = newton.Newton("Newton")
+    fractal.xres, fractal.yres = 60, 60
+    result = fractal.computeView(
+        fractal.view(), f=getattr(newton, f), a=2.0, e=2.0)
+    # Smaller than real and imaginary values and counts as float64.
+    assert result.nbytes < 3 * 8 * 60 * 60
+    assert result.rootValues.size < 60 * 60 // 10
@@ -0,0 +1,144 @@
+import pickle
+
+import numpy as np
+
+from fractalresult import FractalResult
+
+
+def rooted(values, shape=None):
+    """Return result of pixels settled on the given complex values."""
+    z = np.asarray(values, dtype=complex)
+    if shape is not None:
+        z = z.reshape(shape)
+    return FractalResult.fromRoots(z, np.ones(z.shape, dtype=np.uint16))
+
+
+def test_from_roots_tables_values_within_tolerance():
+    result = rooted([1, 1 + 1e-9, -1, np.nan, 1e6, 1e6 + 1e-3])
+    assert result.rootValues.size == 4
+    assert np.isnan(result.rootValues[0])
+    roots = result.roots.tolist()
+    assert roots[0] == roots[1] and roots[4] == roots[5]
+    assert roots[3] == 0
+    assert len(set(roots)) == 4
+    assert np.allclose(result.rootValue()[[0, 2, 4]], [1, -1, 1e6])
+
+
+def test_from_roots_keeps_values_apart():
+    result = rooted([1e-3, 2e-3, 1e9, 1e9 + 1e4])
+    assert len(set(result.roots.tolist())) == 4
+
+
+def test_from_roots_keeps_unconverged_values_as_points():
+    z = np.array([1, 2, 3 + 1e-9, 3, np.inf])
+    converged = np.array([True, False, False, True, False])
+    result = FractalResult.fromRoots(z, None, converged=converged)
+    assert result.rootValues.size == 3
+    assert result.roots.tolist() == [1, 0, 0, 2, 0]
+    assert result.points.dtype == np.complex64
+    assert np.array_equal(result.rootValue()[:4], [1, 2, 3, 3])
+    assert np.isnan(result.rootValue()[4])
+
+    # Without unconverged finite values, no points are kept.
+    converged = np.isfinite(z)
+    assert FractalResult.fromRoots(z, None, converged=converged).points \
+        is None
+
+
+def test_indexing_drops_unused_roots():
+    result = rooted(np.arange(12), (3, 4))
+    result.fractions = np.full((3, 4), 0.5, dtype=np.float32)
+    assert result[:, :].rootValues is result.rootValues
+
+    cropped = result[1:, ::2]
+    assert cropped.shape == (2, 2)
+    assert cropped.rootValues.size == 5
+    assert np.array_equal(cropped.rootValue(), [[4, 6], [8, 10]])
+    assert np.array_equal(cropped.value(), np.full((2, 2), 1.5))
+
+
+def test_assignment_merges_root_tables():
+    whole = rooted([1, 2, np.nan, 1])
+    whole[1:3] = rooted([3, 1])
+    assert np.array_equal(whole.rootValue()[[0, 1, 2, 3]], [1, 3, 1, 1])
+    # Root 2 is no longer indexed.
+    assert whole.rootValues.size == 3
+
+    # Missing components take zero; new ones are gained.
+    whole[:2] = FractalResult(counts=np.array([5, 6], dtype=np.uint16),
+                              fractions=np.array([0.25, 0.5], np.float32))
+    assert whole.value().tolist() == [5.25, 6.5, 1, 1]
+
+
+def test_assignment_widens_roots():
+    values = np.repeat(np.arange(255), 2)
+    whole = rooted(values)
+    assert whole.roots.dtype == np.uint8
+    whole[:10] = rooted(np.arange(1000, 1010))
+    assert whole.roots.dtype == np.uint16
+    assert whole.rootValues.size == 256 - 5 + 10
+    assert np.allclose(whole.rootValue()[:10], np.arange(1000, 1010))
+    assert np.allclose(whole.rootValue()[10:], values[10:])
+
+
+def test_assignment_merges_points():
+    whole = rooted([1, 2, 3])
+    unconverged = FractalResult.fromRoots(
+        np.array([4, 5]), None, converged=np.array([False, True]))
+    whole[1:] = unconverged
+    assert np.array_equal(whole.rootValue(), [1, 4, 5])
+    whole[1:] = rooted([6, 7])
+    assert np.array_equal(whole.rootValue(), [1, 6, 7])
+    assert whole.rootValues.size == 4
+
+    joined = FractalResult.concatenate([rooted([1]), unconverged])
+    assert np.array_equal(joined.rootValue(), [1, 4, 5])
+
+
+def test_concatenate():
+    left = rooted([1, 2], (1, 2))
+    right = rooted([2, 3], (1, 2))
+    right.fractions = np.array([[0.5, 0.25]], dtype=np.float32)
+    joined = FractalResult.concatenate([left, right])
+    assert joined.shape == (1, 4)
+    assert np.array_equal(joined.rootValue(), [[1, 2, 2, 3]])
+    assert joined.rootValues.size == 4
+    assert joined.value().tolist() == [[1, 1, 1.5, 1.25]]
+
+
+def test_mean_averages_values_and_votes_on_roots():
+    samples = rooted([1, 2, 2, 1, 3, 3, 3, 1], (2, 4))
+    samples.counts = np.array([[1, 2, 3, 4], [0, 0, 1, 1]], dtype=np.uint16)
+    mean = samples.mean()
+    assert mean.counts.tolist() == [2, 0]
+    assert np.allclose(mean.value(), [2.5, 0.5])
+    # Ties go to the earliest sample.
+    assert np.array_equal(mean.rootValue(), [1, 3])
+    assert mean.rootValues.size == 3
+
+
+def test_mean_votes_each_point_apart():
+    z = np.array([[5, 5, 1, 2], [5, 5, 1, 1]])
+    converged = np.array([[False, False, True, True]] * 2)
+    mean = FractalResult.fromRoots(z, None, converged=converged).mean()
+    assert np.array_equal(mean.rootValue(), [5, 1])
+    assert mean.rootValues.size == 2
+
+
+def test_records_and_pickling():
+    result = rooted([1j, np.nan])
+    result.fractions = np.array([0.5, 0], dtype=np.float32)
+    records = result.toRecords()
+    assert records.dtype.names == ("count", "fraction", "root", "tabled")
+    assert records["count"].tolist() == [1, 1]
+    assert records["root"][0] == 1j and np.isnan(records["root"][1])
+
+    unconverged = FractalResult.fromRoots(
+        np.array([1, 2]), None, converged=np.array([True, False]))
+    copy = FractalResult.fromRecords(unconverged.toRecords())
+    assert np.array_equal(copy.roots, unconverged.roots)
+    assert np.array_equal(copy.points, unconverged.points, equal_nan=True)
+
+    copy = pickle.loads(pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+    assert np.array_equal(copy.value(), result.value())
+    assert np.array_equal(copy.roots, result.roots)
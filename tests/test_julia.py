@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from julia import INVERSE_ITERATION, Julia
+
+
+# Douady rabbit.
+C = complex(-0.12, 0.75)
+
+
+def set_args(fractal, **values):
+    for control in fractal.controls._controls:
+        if control.key() in values:
+            control.setValue(values[control.key()])
+
+
+@pytest.fixture
+def julia(app):
+    fractal = Julia("Julia Set")
+    fractal.xres, fractal.yres = 120, 100
+    set_args(fractal, cr=C.real, ci=C.imag, m=INVERSE_ITERATION)
+    return fractal
+
+
+def boundary_distance(fractal, iterations=500):
+    """Return the distance from each pixel to the Julia set, in pixels, as
+       estimated from its orbit; infinite for orbits that do not escape."""
+    z = fractal._complexPlane(fractal.xres, fractal.yres, *fractal.view())
+    dz = np.ones(z.shape, dtype=complex)
+    escaped = np.zeros(z.shape, dtype=bool)
+    for _ in range(iterations):
+        active = ~escaped
+        dz[active] = 2 * z[active] * dz[active]
+        z[active] = np.square(z[active]) + C
+        escaped |= np.absolute(z) > 1e6
+    magnitude = np.absolute(z)
+    distance = np.full(z.shape, np.inf)
+    distance[escaped] = (magnitude * np.log(magnitude) / np.absolute(dz))[
+        escaped]
+    view = fractal.view()
+    return distance / ((view[2] - view[0]) / (fractal.xres - 1))
+
+
+def dilated(mask):
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= grown[:, :-1].copy()
+    grown[:, :-1] |= grown[:, 1:].copy()
+    return grown
+
+
+@pytest.mark.parametrize("view", [
+    (-1.6, -1.2, 1.6, 1.2),
+    # Zoomed in tenfold about the fixed point where the rabbit's ears meet.
+    (-0.437, 0.35, -0.117, 0.617),
+])
+def test_inverse_iteration_traces_the_boundary(julia, view):
+    julia.setView(*view)
+    marked = julia.computeView(julia.view()).counts.astype(bool)
+    distance = boundary_distance(julia)
+    interior = np.isinf(distance)
+    near = (distance < 2) | (interior & dilated(dilated(~interior)))
+    assert marked.any()
+    # Marked pixels lie by the set, and pixels the set crosses are marked.
+    assert np.all(near[marked])
+    assert np.all(dilated(marked)[distance < 0.25])
+
+
+def test_boundary_points_are_cached_for_each_c(julia):
+    julia.computeView(julia.view())
+    cached = dict(julia._boundaries._values)
+    assert len(cached) == 1
+
+    # Rendering again, or zooming within the same grid, reuses the points.
+    julia._results.clear()
+    julia.computeView(julia.view())
+    julia.zoom(0.1)
+    julia.computeView(julia.view())
+    assert dict(julia._boundaries._values) == cached
+
+    set_args(julia, cr=0.25)
+    julia.computeView(julia.view())
+    assert len(julia._boundaries._values) == 2
+
+
+def test_equalized_boundary_is_marked(julia):
+    julia.equalizeHistogram = True
+    image = julia.image()
+    marked = julia.computeView(julia.view()).counts.astype(bool).T
+    assert marked.any()
+    # Boundary pixels, all counted once, are coloured unlike the rest.
+    background = image[~marked]
+    assert np.all(background == background[0])
+    assert np.all(np.any(image[marked] != background[0], axis=-1))
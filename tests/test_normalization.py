@@ -0,0 +1,73 @@
+import numpy as np
+
+from fractalresult import FractalResult
+from normalization import Normalization
+
+
+def counted(counts, fractions=None):
+    counts = np.asarray(counts, dtype=np.uint16)
+    if fractions is not None:
+        fractions = np.asarray(fractions, dtype=np.float32)
+    return FractalResult(counts=counts, fractions=fractions)
+
+
+def test_merged_tiles_summarize_the_whole():
+    rng = np.random.RandomState(0)
+    whole = counted(rng.randint(0, 50, (3, 8, 6)), rng.random_sample((3, 8, 6)))
+    merged = Normalization()
+    for x in range(0, 8, 3):
+        merged.update(whole[..., x:x + 3, :])
+    summary = Normalization.fromResult(whole)
+
+    assert np.array_equal(merged.minimum["value"], summary.minimum["value"])
+    assert np.array_equal(merged.maximum["value"], summary.maximum["value"])
+    assert np.array_equal(merged.histogram, summary.histogram)
+    assert merged.histogram.shape[0] == 3
+
+
+def test_histogram_only_built_when_asked_for():
+    result = counted([[1, 2], [3, 0]])
+    assert Normalization.fromResult(result, histogram=False).histogram is None
+    merged = Normalization().update(result, False).update(result)
+    assert merged.histogram.tolist() == [1, 1, 1, 1]
+    assert merged.maximum["value"] == 3
+
+
+def test_roots_are_summarized_by_value():
+    z = np.array([[1 + 2j, -3j], [np.nan, 2]])
+    result = FractalResult.fromRoots(z, np.ones(z.shape, dtype=np.uint16))
+    summary = Normalization.fromResult(result)
+    assert summary.minimum["real"] == 0 and summary.maximum["real"] == 2
+    assert summary.minimum["imag"] == -3 and summary.maximum["imag"] == 2
+
+
+def test_equalize():
+    result = counted([[0, 1, 1, 2], [3, 3, 3, 9]], np.full((2, 4), 0.5))
+    result.counts[0, 0] = 0
+    result.fractions[0, 0] = 0
+    equalized = Normalization.fromResult(result).equalize(result)
+
+    # Zero stays zero; seven nonzero values take the middle of their bins.
+    assert equalized[0, 0] == 0
+    assert np.allclose(equalized.ravel()[1:],
+                       np.array([1, 1, 2.5, 4.5, 4.5, 4.5, 6.5]) / 7)
+    order = np.argsort(result.value().ravel(), kind="mergesort")
+    assert np.all(np.diff(equalized.ravel()[order]) >= 0)
+
+
+def test_equalize_integer_counts():
+    result = counted([[0, 1], [1, 2]])
+    equalized = Normalization.fromResult(result).equalize(result)
+    # Integer values take the fraction of nonzero values up to their own.
+    assert np.allclose(equalized, [[0, 2 / 3.0], [2 / 3.0, 1]])
+
+
+def test_equalize_per_channel_and_beyond_summary():
+    result = counted([[[1, 2]], [[5, 5]]])
+    normalization = Normalization.fromResult(result)
+    assert np.allclose(normalization.equalize(result), [[[0.5, 1]], [[1, 1]]])
+
+    # Values beyond those summarized, e.g. by a preview, take 1.
+    larger = counted([[[9, 1]], [[20, 5]]])
+    assert np.allclose(normalization.equalize(larger),
+                       [[[1, 0.5]], [[1, 1]]])
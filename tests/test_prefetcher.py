@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from mandelbrot import Mandelbrot
+from prefetcher import Prefetcher
+
+
+@pytest.fixture
+def mandelbrot(app):
+    fractal = Mandelbrot("Mandelbrot Set")
+    # Several bands of Fractal.PREFETCH_BAND rows.
+    fractal.xres, fractal.yres = 40, 75
+    fractal.setView(-0.8, -0.25, -0.6, -0.05)
+    return fractal
+
+
+def direct_render(fractal, view):
+    other = Mandelbrot("Mandelbrot Set")
+    other.xres, other.yres = fractal.xres, fractal.yres
+    other.setView(*view)
+    return other.computeView(other.view())
+
+
+def forbid_computing(fractal):
+    def fail(*args, **kwargs):
+        raise AssertionError("prefetched view computed again")
+    fractal._computeRaw = fail
+
+
+@pytest.mark.parametrize("use_pyramid", [False, True])
+def test_prefetched_views_match_direct_renders(mandelbrot, use_pyramid):
+    mandelbrot.usePyramid = use_pyramid
+    view = mandelbrot.zoomedView(0.5)
+    args = mandelbrot.controls.args()
+    assert mandelbrot.prefetchView(mandelbrot.frame(view), lambda: False,
+                                   **args)
+
+    forbid_computing(mandelbrot)
+    mandelbrot.setView(*view)
+    prefetched = mandelbrot.computeView(mandelbrot.view())
+    expected = direct_render(mandelbrot, view)
+    assert np.allclose(prefetched.value(), expected.value(), atol=1e-9)
+
+
+def test_cancelled_prefetches_cache_nothing(mandelbrot):
+    frame = mandelbrot.frame(mandelbrot.zoomedView(0.5))
+    checks = []
+
+    def cancelled():
+        checks.append(None)
+        return len(checks) > 1
+
+    assert not mandelbrot.prefetchView(
+        frame, cancelled, **mandelbrot.controls.args())
+    assert len(checks) == 2
+    assert not mandelbrot._results._values
+
+
+def test_prefetcher_computes_scheduled_views(mandelbrot):
+    prefetcher = Prefetcher()
+    view = mandelbrot.zoomedView(-1.0)
+    args = mandelbrot.controls.args()
+    prefetcher.schedule(mandelbrot, [(mandelbrot.frame(view), args)])
+
+    key = mandelbrot._resultKey(mandelbrot.frame(view), args)
+    deadline = time.time() + 10
+    while mandelbrot._results.get(key) is None and time.time() < deadline:
+        time.sleep(0.01)
+    prefetcher.cancel()
+
+    forbid_computing(mandelbrot)
+    mandelbrot.setView(*view)
+    prefetched = mandelbrot.computeView(mandelbrot.view())
+    expected = direct_render(mandelbrot, view)
+    assert np.array_equal(prefetched.value(), expected.value())
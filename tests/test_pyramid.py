@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from fractalresult import FractalResult
+from pyramid import Pyramid
+
+
+def plane(n, m, xmin, ymin, xmax, ymax):
+    x = np.linspace(xmin, xmax, n)
+    y = np.linspace(ymin, ymax, m)
+    return x[:, np.newaxis] + 1j * y[np.newaxis, :]
+
+
+class Counter(object):
+    """Computes a smooth function of each point, counting the points."""
+
+    def __init__(self):
+        self.points = 0
+
+    def __call__(self, complex_plane):
+        self.points += complex_plane.size
+        return FractalResult(fractions=np.absolute(complex_plane) ** 2)
+
+
+@pytest.fixture
+def pyramid():
+    # Level 0 samples [-2, 2] x [-2, 2] with 40 x 40 pixels.
+    return Pyramid((-2.0, -2.0), (4.0 / 39, 4.0 / 39))
+
+
+def compose(pyramid, compute, view, symmetry=None):
+    return pyramid.compose(40, 40, *view, key=0, complex_plane=plane,
+                           compute=compute, symmetry=symmetry)
+
+
+@pytest.mark.parametrize("level", [-2, -1, 0, 1, 3])
+def test_snapped_views_lie_on_the_lattice(pyramid, level):
+    view = pyramid.snapView(40, 40, -0.3, 0.1, 0.5, 0.7, level)
+    assert pyramid.isAligned(40, 40, *view)
+    assert pyramid.nearestLevel(40, 40, *view) == level
+    assert np.isclose(view[2] - view[0], 4.0 / 2 ** level)
+    # Views stay centred within half a lattice point.
+    spacing = 4.0 / 39 / 2 ** level
+    assert abs((view[0] + view[2]) / 2 - 0.1) <= spacing / 2 + 1e-12
+
+
+def test_composed_views_match_direct_evaluation(pyramid):
+    compute = Counter()
+    for level in (0, -1, 1, 2, -2):
+        view = pyramid.snapView(40, 40, -0.3, 0.1, 0.5, 0.7, level)
+        composed = compose(pyramid, compute, view)
+        direct = Counter()(plane(40, 40, *view))
+        assert np.allclose(composed.fractions, direct.fractions, rtol=1e-12)
+
+
+def test_zoom_outs_reuse_finer_tiles(pyramid):
+    compute = Counter()
+    compose(pyramid, compute, (-2.0, -2.0, 2.0, 2.0))
+    assert compute.points == 40 * 40
+
+    # Every other pixel of each axis, a quarter of the view zoomed out
+    # about its centre, is a pixel of the view before.
+    compute.points = 0
+    view = pyramid.snapView(40, 40, -2.0, -2.0, 2.0, 2.0, -1)
+    compose(pyramid, compute, view)
+    assert compute.points == 40 * 40 - 20 * 20
+
+    # Zooming back in needs nothing more.
+    compute.points = 0
+    compose(pyramid, compute, (-2.0, -2.0, 2.0, 2.0))
+    assert compute.points == 0
+
+
+def test_only_the_view_is_computed(pyramid):
+    compute = Counter()
+    view = pyramid.snapView(40, 40, -0.3, 0.1, 0.5, 0.7, 1)
+    compose(pyramid, compute, view)
+    assert compute.points == 40 * 40
+
+
+def test_symmetric_views_mirror_half_their_pixels(pyramid):
+    compute = Counter()
+    view = (-2.0, -2.0, 2.0, 2.0)
+    composed = compose(pyramid, compute, view, symmetry=(0, 1))
+    assert compute.points == 20 * 40
+    direct = Counter()(plane(40, 40, *view))
+    assert np.allclose(composed.fractions, direct.fractions, rtol=1e-12)
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from fractalresult import FractalResult
+from normalization import Normalization
+import renderstream
+from renderstream import PngWriter, TiffWriter, render_to_file, spill
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def image(height, width):
+    rng = np.random.RandomState(0)
+    return rng.randint(0, 256, (height, width, 3)).astype(np.uint8)
+
+
+@pytest.mark.parametrize("writer_type, extension", [
+    (PngWriter, ".png"), (TiffWriter, ".tif")])
+@pytest.mark.parametrize("band_height", [1, 4, 7])
+def test_writers_round_trip(tmpdir, writer_type, extension, band_height):
+    expected = image(10, 13)
+    filename = str(tmpdir.join("image" + extension))
+    writer = writer_type(filename, 13, 10)
+    for row in range(0, 10, band_height):
+        writer.writeRows(expected[row:row + band_height])
+    writer.close()
+
+    assert np.array_equal(np.asarray(Image.open(filename)), expected)
+
+
+def test_spill_merges_every_result_before_yielding():
+    results = [FractalResult(counts=np.full((2, 2), k, dtype=np.uint16))
+               for k in range(1, 4)]
+    normalization = Normalization()
+    spilled = spill(iter(results), normalization, histogram=False)
+
+    first = next(spilled)
+    assert normalization.maximum["value"] == 3
+    assert normalization.histogram is None
+    assert [first.counts[0, 0]] + [r.counts[0, 0] for r in spilled] == [
+        1, 2, 3]
+
+
+@pytest.fixture
+def no_spill(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Bands were spilled")
+    monkeypatch.setattr(renderstream, "spill", fail)
+
+
+def fractal(name):
+    """Return new instance of a fractal class, at a small resolution."""
+    pytest.importorskip("PyQt5")
+    from fractals import fractals
+
+    fractal = type(getattr(fractals, name))(name)
+    fractal.xres, fractal.yres = 37, 29
+    fractal.aaSamples = 4
+    return fractal
+
+
+@pytest.mark.parametrize("name", ["MANDELBROT", "JULIA"])
+def test_fixed_range_fractals_stream_without_spilling(
+        app, tmpdir, no_spill, name):
+    streamed = fractal(name)
+    filename = str(tmpdir.join("image.png"))
+    render_to_file(streamed, filename, band_height=8)
+    assert np.array_equal(np.asarray(Image.open(filename)), streamed.image())
+
+
+@pytest.mark.parametrize("name", ["PHEONIX", "NEWTON", "MANDELBROT"])
+@pytest.mark.parametrize("extension", [".png", ".tif"])
+def test_streamed_images_match_image(app, tmpdir, name, extension):
+    streamed = fractal(name)
+    streamed.equalizeHistogram = name == "MANDELBROT"
+    filename = str(tmpdir.join("image" + extension))
+    render_to_file(streamed, filename, band_height=8)
+    assert np.array_equal(np.asarray(Image.open(filename)), streamed.image())
+
+
+@pytest.mark.parametrize("name", ["PHEONIX", "NEWTON"])
+def test_raw_store_is_read_back_rather_than_spilled(
+        app, tmpdir, no_spill, name):
+    streamed = fractal(name)
+    filename = str(tmpdir.join("image.png"))
+    raw_filename = str(tmpdir.join("raw.npy"))
+    render_to_file(streamed, filename, raw_filename, band_height=8)
+
+    raw = streamed.computeView(streamed.view())
+    stored = np.load(raw_filename)
+    assert stored.shape == (streamed.yres, streamed.xres)
+    for name in stored.dtype.names:
+        assert np.array_equal(
+            stored[name], np.swapaxes(raw.toRecords()[name], -1, -2))
+
+    # Roots read back in single precision may round differently.
+    difference = np.asarray(Image.open(filename)).astype(int) - \
+        streamed.image()
+    assert np.absolute(difference).max() <= 1
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from utils import adjustRange, edgeMask, jitterOffsets, mirrorPixels, \
+    powerFunction
+
+
+@pytest.mark.parametrize("p", [2, 3, 5, -1, -2, 0, 0.5, 2.5, -1.5, 1.3, -0.7])
+def test_power_function_matches_np_power(p):
+    rng = np.random.RandomState(0)
+    z = rng.normal(size=100) + 1j * rng.normal(size=100)
+    z[0] = 0
+    with np.errstate(all="ignore"):
+        expected = np.power(z, p)
+        power = powerFunction(p)(z, np.absolute(z))
+
+    finite = np.isfinite(expected)
+    assert np.array_equal(finite, np.isfinite(power))
+    assert np.allclose(power[finite], expected[finite], rtol=1e-12)
+
+
+def test_power_function_leaves_overflowed_orbits_to_np_power():
+    z = np.array([complex(np.inf, 0), complex(np.nan, np.nan), 1j])
+    with np.errstate(all="ignore"):
+        power = powerFunction(1.3)(z, np.absolute(z))
+        expected = np.power(z, 1.3)
+    assert np.array_equal(np.isnan(power), np.isnan(expected))
+    assert np.allclose(power[2], expected[2])
+
+
+def test_adjust_range():
+    a = np.array([0.0, 1.0, 2.0, 4.0])
+    assert adjustRange(a).tolist() == [0, 63, 127, 255]
+    # Values beyond amax are clipped.
+    assert adjustRange(a, 10, 20, amax=2.0).tolist() == [10, 15, 20, 20]
+
+
+def test_edge_mask_marks_both_sides_of_a_step():
+    a = np.zeros((4, 5))
+    a[2:, :] = 10
+    mask = edgeMask(a, 1)
+    assert mask[1:3].all()
+    assert not mask[0].any() and not mask[3].any()
+    assert not edgeMask(a, 10).any()
+
+
+def test_edge_mask_combines_components():
+    a = np.zeros((2, 3, 3))
+    a[1, 1, 1] = 5
+    mask = edgeMask(a, 1)
+    assert mask.tolist() == [
+        [False, True, False], [True, True, True], [False, True, False]]
+
+
+def test_jitter_offsets_are_stratified():
+    offsets = jitterOffsets(5, seed=1)
+    assert offsets.size == 9
+    assert np.all(np.abs(offsets.real) <= 0.5)
+    assert np.all(np.abs(offsets.imag) <= 0.5)
+    cells = np.floor((offsets.real + 0.5) * 3) + 3 * np.floor(
+        (offsets.imag + 0.5) * 3)
+    assert sorted(cells) == list(range(9))
+    assert np.array_equal(offsets, jitterOffsets(5, seed=1))
+
+
+def test_mirror_pixels_about_real_axis():
+    bounds = (3, 5, -1.0, -1.0, 1.0, 1.0)
+    mask, mi, mj = mirrorPixels(bounds, (1,))
+
+    # Pixels below the axis mirror those above it; the axis mirrors itself.
+    expected = np.zeros((3, 5), dtype=bool)
+    expected[:, 3:] = True
+    assert np.array_equal(mask, expected)
+    flagged_i, flagged_j = np.nonzero(mask)
+    assert np.array_equal(mi, flagged_i)
+    assert np.array_equal(mj, 4 - flagged_j)
+
+
+def test_mirror_pixels_about_origin():
+    bounds = (5, 3, -2.0, -0.5, 2.0, 0.5)
+    mask, mi, mj = mirrorPixels(bounds, (0, 1))
+    flagged_i, flagged_j = np.nonzero(mask)
+    assert np.array_equal(mi, 4 - flagged_i)
+    assert np.array_equal(mj, 2 - flagged_j)
+    # Every pixel but the origin is either flagged or mirrored by one that is.
+    assert mask.sum() == (mask.size - 1) // 2
+
+
+def test_mirror_pixels_off_grid_or_off_axis():
+    # Mirrored pixels fall between pixels of the grid.
+    assert mirrorPixels((4, 4, -1.0, -1.0, 1.0, 1.1), (1,)) is None
+    # Too few pixels mirror one another.
+    assert mirrorPixels((4, 100, -1.0, -0.01, 1.0, 1.97), (1,)) is None